@@ -1,12 +1,24 @@
 
 import threading
-from typing import List, Tuple, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Dict, Any, Optional, Set
 
+from app.db.site_oper import SiteOper
 from app.helper.downloader import DownloaderHelper
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType
 from app.core.event import eventmanager, Event
+from app.utils.string import StringUtils
+
+from .backfill import iter_qbittorrent, iter_transmission
+from .coalescer import TagCoalescer
+from .content import ContentTagger, Contents
+from .hashindex import HashIndex
+from .journal import TagJournal
+from .labels import Labels, LabelsIndex
+from .rules import TagRules
+from .workers import WorkerPool
 
 class DownloaderTagAdder(_PluginBase):
     # 插件名称
@@ -16,7 +28,7 @@ class DownloaderTagAdder(_PluginBase):
     # 插件图标
     plugin_icon = "world.png"
     # 插件版本
-    plugin_version = "1.0.1"
+    plugin_version = "1.8.0"
     # 插件作者
     plugin_author = "velor2012"
     # 作者主页
@@ -30,18 +42,41 @@ class DownloaderTagAdder(_PluginBase):
     # 日志前缀
     LOG_TAG = "[DownloaderTagAdder]"
 
-    # 退出事件
+    # 退出事件，置位后不再接收新事件，回填任务中断
     _event = threading.Event()
     # 私有属性
     downloader_helper = None
     _scheduler = None
     _enabled = False
     _downloaders = None
-    _downloader_configs = {}  # 下载器独立配置，存储自定义标签
+    _fanout = False
+    _hash_index: Optional[HashIndex] = None
+    _content_tags = False
+    _content_cache_size = 2000
+    _content_tagger: Optional[ContentTagger] = None
+    _downloader_configs = {}  # 下载器独立配置，存储自定义标签及编译后的标签规则
+    _coalesce_window = 2.0
+    _coalesce_size = 50
+    _coalescer: Optional[TagCoalescer] = None
+    _workers = 2
+    _queue_size = 200
+    _pool: Optional[WorkerPool] = None
+    _journal: Optional[TagJournal] = None
+    _replay_lock = threading.Lock()
+    _labels_index: Optional[LabelsIndex] = None
+    _onlyonce = False
+    _backfill_interval = 0
+    _backfill_page_size = 500
+    _backfill_delay = 1.0
+    _backfill_lock = threading.Lock()
 
     def init_plugin(self, config: dict = None):
         self.downloader_helper = DownloaderHelper()
         logger.info(f"{self.LOG_TAG} 初始化 ...")
+        # 重新初始化前停止旧的线程，先置位退出事件使新到的事件不再入队
+        self._event.set()
+        self.__stop_workers()
+        self._event = threading.Event()
         # 读取配置
         if config:
             self._enabled = config.get("enabled")
@@ -50,10 +85,56 @@ class DownloaderTagAdder(_PluginBase):
             self._downloader_configs = {}
             for dl in self.downloader_helper.get_configs().values():
                 if f"{dl.name}_custom_tags" in config:
+                    custom_tags = (config.get(f"{dl.name}_custom_tags") or "").split("\n")
                     self._downloader_configs[dl.name] = {
-                        "custom_tags": config.get(f"{dl.name}_custom_tags", "").split("\n")
+                        "custom_tags": custom_tags,
+                        "rules": TagRules(custom_tags)
                     }
+            self._coalesce_window = self.__to_float(config.get("coalesce_window"), 2.0)
+            self._coalesce_size = max(1, int(self.__to_float(config.get("coalesce_size"), 50)))
+            self._fanout = config.get("fanout")
+            self._content_tags = config.get("content_tags")
+            self._content_cache_size = max(1, int(self.__to_float(config.get("content_cache_size"), 2000)))
+            self._workers = max(1, int(self.__to_float(config.get("workers"), 2)))
+            self._queue_size = max(1, int(self.__to_float(config.get("queue_size"), 200)))
+            self._onlyonce = config.get("onlyonce")
+            self._backfill_interval = self.__to_float(config.get("backfill_interval"), 0)
+            self._backfill_page_size = max(1, int(self.__to_float(config.get("backfill_page_size"), 500)))
+            self._backfill_delay = max(0.0, self.__to_float(config.get("backfill_delay"), 1.0))
+        # Transmission 标签索引，追加标签时不再先查询原标签
+        self._labels_index = LabelsIndex(loader=self.__load_labels)
+        # 下载器离线时待打标签的种子记录到日志，恢复后补打
+        self._journal = TagJournal(self.get_data_path() / "journal.db")
+        # 按种子内容识别分辨率、编码等标签，识别结果按 infohash 缓存
+        self._content_tagger = ContentTagger(loader=self.__load_contents,
+                                             max_items=self._content_cache_size) if self._content_tags else None
+        # 各下载器中已有种子的索引，跨下载器同步标签时判断辅种
+        self._hash_index = HashIndex(loader=self.__load_hashes)
+        # 事件处理及下载器请求都在工作线程中执行，事件线程只负责入队；
+        # 跨下载器同步时线程数不少于所选下载器数，各下载器的请求并行提交
+        workers = self._workers
+        if self._fanout and self._downloaders:
+            workers = max(workers, len(self._downloaders))
+        self._pool = WorkerPool(workers=workers, queue_size=self._queue_size)
+        # 合并打标签请求，合并后的请求交给工作线程提交
+        self._coalescer = TagCoalescer(flush=self.__submit_flush,
+                                       window=self._coalesce_window,
+                                       max_size=self._coalesce_size)
+        if self._onlyonce:
+            self._onlyonce = False
+            config["onlyonce"] = False
+            self.update_config(config)
+            # 回填耗时较长，放到后台线程执行
+            threading.Thread(target=self.backfill_tags, name="DownloaderTagAdder-backfill", daemon=True).start()
         logger.info(f"{self.LOG_TAG} 初始化 完成")
+
+    @staticmethod
+    def __to_float(value: Any, default: float) -> float:
+        try:
+            return float(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
     @eventmanager.register(EventType.DownloadAdded)
     def listen_download_added_event(self, event: Event = None):
         """
@@ -66,36 +147,369 @@ class DownloaderTagAdder(_PluginBase):
         if not event or not event.event_data:
             logger.warn('事件信息无效，忽略事件')
             return
-        # 执行
-        logger.info('下载添加事件监听任务执行开始...')
+        pool = self._pool
+        if self._event.is_set() or not pool:
+            logger.warn('插件正在停止，忽略事件')
+            return
         # enable_seeding=True是针对辅种添加种子并跳过校验的场景
-        _hash = event.event_data.dict().get('hash')
-        downloader = event.event_data.dict().get("downloader")
+        event_data = event.event_data.dict()
+        _hash = event_data.get('hash')
+        downloader = event_data.get("downloader")
+        # 下载器请求放到工作线程执行，不阻塞事件分发
+        if pool.submit(self.__handle_added, downloader, _hash, self.__match_fields(event_data)):
+            logger.info(f'种子 {_hash} 已加入标签任务队列')
+
+    def __handle_added(self, downloader: str, _hash: str, fields: Tuple[str, str, str, str]):
+        """
+        在工作线程中处理下载添加事件
+        只处理所选的下载器（未选择时处理全部）；开启跨下载器同步时，所选下载器中有该种子的也一并打标签
+        """
+        logger.info('下载添加事件监听任务执行开始...')
+        self._hash_index.add(downloader, _hash)
+        targets = [downloader]
+        if self._fanout and self._downloaders:
+            targets += [name for name in self._downloaders
+                        if name != downloader and self._hash_index.contains(name, _hash)]
+            if len(targets) > 1:
+                logger.info(f"种子 {_hash} 同时存在于下载器 {targets[1:]}，同步添加标签")
+        for target in targets:
+            if self._downloaders and target not in self._downloaders:
+                logger.info(f"下载器 {target} 未选择，忽略")
+                continue
+            self.__tag_torrent(target, _hash, fields)
+        logger.info('下载添加事件监听任务执行结束')
+
+    def __tag_torrent(self, downloader: str, _hash: str, fields: Tuple[str, str, str, str]):
+        """
+        按下载器的规则计算标签并登记到合并缓冲区
+        """
+        # 获取下载器配置中的自定义标签，条件规则按种子名称、站点、分类、保存路径匹配
+        tag = []
+        logger.info(f"获取下载器 {downloader} 自定义标签")
+        rules: TagRules = self._downloader_configs.get(downloader, {}).get("rules")
+        if rules:
+            tag = rules.resolve(*fields)
+        if not tag and not self._content_tagger:
+            logger.info('未配置或未匹配到自定义标签，忽略事件')
+            return
         service = self.downloader_helper.get_service(downloader)
-        downloader_obj = service.instance
+        downloader_obj = service.instance if service else None
         if not service or not downloader_obj:
             logger.error(f"未获取到下载器：{downloader}")
             return
         if downloader_obj.is_inactive():
-            logger.error(f"下载器 {downloader} 不在线")
+            logger.error(f"下载器 {downloader} 不在线，记录待恢复后补打标签")
+            self._journal.record(downloader, [(_hash, tag)])
             return
-        
-        # 获取下载器配置中的自定义标签
-        tag = []
-        logger.info(f"获取下载器 {downloader} 自定义标签")
-        logger.info(f'配置为{self._downloader_configs}')
-        if downloader in self._downloader_configs:
-            tag.extend(self._downloader_configs[downloader].get("custom_tags", []))
-        
-        if service.type == "qbittorrent":
-            downloader_obj.set_torrents_tag(ids=_hash, tags=tag)
+        if self._journal.has(downloader):
+            # 下载器已恢复，顺带补打离线期间的标签
+            self._pool.submit(self.replay_journal)
+        # 登记到合并缓冲区，由后台线程批量提交
+        self._coalescer.add(downloader, _hash, tag)
+
+    @staticmethod
+    def __match_fields(event_data: dict) -> Tuple[str, str, str, str]:
+        """
+        取出规则匹配用的种子名称、站点、分类、保存路径
+        """
+        def _get(obj: Any, key: str) -> Any:
+            if obj is None:
+                return None
+            if isinstance(obj, dict):
+                return obj.get(key)
+            return getattr(obj, key, None)
+
+        context = event_data.get("context")
+        torrent_info = _get(context, "torrent_info")
+        media_info = _get(context, "media_info")
+        name = _get(torrent_info, "title") or event_data.get("name")
+        site = _get(torrent_info, "site_name") or event_data.get("site_name")
+        category = _get(media_info, "category") or event_data.get("category")
+        save_path = event_data.get("save_path") or event_data.get("download_dir")
+        return name or "", site or "", category or "", str(save_path or "")
+
+    def __submit_flush(self, downloader: str, tags: List[str], hashes: List[str]):
+        """
+        合并后的打标签请求交给工作线程，队列满时合并线程等待（背压）
+        """
+        if self._pool:
+            self._pool.submit(self.__flush_tags, downloader, tags, hashes)
         else:
-            # 由于 tr 会覆盖原标签，此处设置追加
-            _tags = downloader_obj.get_torrent_tags(ids=_hash)
-            downloader_obj.set_torrent_tag(ids=_hash, tags=tag, org_tags=_tags)
+            self.__flush_tags(downloader, tags, hashes)
 
-        logger.info('下载添加事件监听任务执行结束')
+    def __flush_tags(self, downloader: str, tags: List[str], hashes: List[str]):
+        """
+        提交合并后的打标签请求，未成功的种子记录到日志待补打
+        """
+        failed = self.__write_with_content(downloader, tags, hashes)
+        if failed:
+            self._journal.record(downloader, [(_hash, tags) for _hash in failed])
+
+    def __write_with_content(self, downloader: str, tags: List[str], hashes: List[str]) -> List[str]:
+        """
+        规则标签加上内容标签后按最终标签分组提交，返回未成功的种子
+        整批种子的元数据一次查询
+        """
+        if not self._content_tagger:
+            return self.__write_tags(downloader, tags, hashes) if tags else []
+        content_tags = self._content_tagger.tags_for(downloader, hashes)
+        groups: Dict[Tuple[str, ...], List[str]] = {}
+        for _hash in hashes:
+            final = list(tags) + [tag for tag in content_tags.get(_hash, []) if tag not in tags]
+            groups.setdefault(tuple(final), []).append(_hash)
+        failed = []
+        for final, ids in groups.items():
+            if final:
+                failed.extend(self.__write_tags(downloader, list(final), ids))
+        return failed
+
+    def __write_tags(self, downloader: str, tags: List[str], hashes: List[str]) -> List[str]:
+        """
+        一次请求为一组种子添加相同的标签，返回未成功的种子
+        """
+        service = self.downloader_helper.get_service(downloader)
+        if not service or not service.instance:
+            logger.error(f"未获取到下载器：{downloader}")
+            return []
+        downloader_obj = service.instance
+        if downloader_obj.is_inactive():
+            logger.error(f"下载器 {downloader} 不在线，{len(hashes)} 个种子未添加标签")
+            return hashes
+
+        failed = []
+        try:
+            if service.type == "qbittorrent":
+                if downloader_obj.set_torrents_tag(ids=hashes, tags=tags) is False:
+                    failed = hashes
+            else:
+                # 由于 tr 会覆盖原标签，此处设置追加；原标签取自本地索引，原标签相同的种子合并为一次请求
+                labels = self._labels_index.lookup(downloader, hashes)
+                if labels is None:
+                    logger.error(f"获取下载器 {downloader} 种子标签失败")
+                    return hashes
+                # 下载器中查不到的种子（如尚未完成添加）计为失败，由日志稍后重放
+                failed = [_hash for _hash in hashes if _hash not in labels]
+                if failed:
+                    logger.warning(f"{self.LOG_TAG} 下载器 {downloader} 中未找到 {len(failed)} 个种子的标签")
+                groups: Dict[Tuple[str, ...], List[str]] = {}
+                for _hash, org_tags in labels.items():
+                    groups.setdefault(tuple(sorted(org_tags)), []).append(_hash)
+                for org_tags, ids in groups.items():
+                    if not self.__set_tr_tags(downloader_obj, downloader, ids, tags, org_tags):
+                        failed.extend(ids)
+        except Exception as err:
+            logger.error(f"{self.LOG_TAG} 下载器 {downloader} 添加标签出错：{err}")
+            return hashes
+        done = [_hash for _hash in hashes if _hash not in failed]
+        for _hash in done:
+            logger.info(f"{self.LOG_TAG} 种子 {_hash} 已添加标签 {tags}")
+        logger.info(f"{self.LOG_TAG} 下载器 {downloader} 合并添加标签 {tags}，"
+                    f"成功 {len(done)} 个，失败 {len(failed)} 个种子")
+        return failed
+
+    def replay_journal(self):
+        """
+        为已恢复在线的下载器补打离线期间的标签，标签相同的种子一次提交
+        """
+        if not self._journal or not self._replay_lock.acquire(blocking=False):
+            return
+        try:
+            for downloader in self._journal.downloaders():
+                service = self.downloader_helper.get_service(downloader)
+                if not service or not service.instance or service.instance.is_inactive():
+                    continue
+                while not self._event.is_set():
+                    groups = self._journal.pending(downloader, limit=self._coalesce_size * 10)
+                    if not groups:
+                        break
+                    failures = 0
+                    for tags, hashes in groups.items():
+                        for i in range(0, len(hashes), self._coalesce_size):
+                            batch = hashes[i:i + self._coalesce_size]
+                            failed = self.__write_with_content(downloader, list(tags), batch)
+                            self._journal.remove(downloader, [_hash for _hash in batch if _hash not in failed])
+                            self._journal.retry(downloader, failed)
+                            failures += len(failed)
+                    if failures:
+                        # 本轮有失败，等下次再试
+                        break
+        finally:
+            self._replay_lock.release()
+
+    def __set_tr_tags(self, downloader_obj: Any, downloader: str, ids: List[str],
+                      tags: List[str], org_tags: Tuple[str, ...]) -> bool:
+        """
+        为原标签相同的一组 Transmission 种子追加标签，并同步本地标签索引
+        """
+        if downloader_obj.set_torrent_tag(ids=ids, tags=tags, org_tags=list(org_tags)):
+            new_tags = frozenset(org_tags) | frozenset(tags)
+            self._labels_index.update(downloader, {_hash: new_tags for _hash in ids})
+            return True
+        # 写入结果未知，下次重新查询
+        self._labels_index.discard(downloader, ids)
+        return False
+
+    def backfill_tags(self):
+        """
+        为下载器中已有的种子回填标签
+        逐页读取种子，计算规则要求的标签与现有标签的差异，只提交缺少的标签；
+        每页完成后记录进度，中断后从断点继续，全部完成后下次从头对账
+        """
+        if not self._downloaders:
+            logger.info(f"{self.LOG_TAG} 未选择下载器，跳过标签回填")
+            return
+        if not self._backfill_lock.acquire(blocking=False):
+            logger.info(f"{self.LOG_TAG} 标签回填正在进行中")
+            return
+        try:
+            # 站点域名 -> 站点名称，用于按站点匹配规则
+            site_names = {site.domain: site.name for site in SiteOper().list() or [] if site.domain}
+            cursors: Dict[str, int] = self.get_data("backfill_cursor") or {}
+            for downloader in self._downloaders:
+                if self._event.is_set():
+                    return
+                rules: TagRules = self._downloader_configs.get(downloader, {}).get("rules")
+                if not rules or not (rules.tags or rules.rules):
+                    continue
+                service = self.downloader_helper.get_service(downloader)
+                if not service or not service.instance or service.instance.is_inactive():
+                    logger.warning(f"{self.LOG_TAG} 下载器 {downloader} 不在线，跳过标签回填")
+                    continue
+                cursor = cursors.get(downloader, 0)
+                if cursor:
+                    logger.info(f"{self.LOG_TAG} 下载器 {downloader} 从断点 {cursor} 继续回填标签")
+                if service.type == "qbittorrent":
+                    pages = iter_qbittorrent(service.instance.qbc, self._backfill_page_size, cursor)
+                else:
+                    pages = iter_transmission(service.instance.trc, self._backfill_page_size, cursor)
+                scanned = changed = 0
+                try:
+                    for cursor, torrents in pages:
+                        changed += self.__backfill_page(service, downloader, rules, site_names, torrents)
+                        scanned += len(torrents)
+                        cursors[downloader] = cursor
+                        self.save_data("backfill_cursor", cursors)
+                        if self._event.wait(self._backfill_delay):
+                            logger.info(f"{self.LOG_TAG} 标签回填已中断，已处理 {scanned} 个种子")
+                            return
+                except Exception as err:
+                    logger.error(f"{self.LOG_TAG} 下载器 {downloader} 标签回填出错：{err}", exc_info=True)
+                    continue
+                cursors.pop(downloader, None)
+                self.save_data("backfill_cursor", cursors)
+                logger.info(f"{self.LOG_TAG} 下载器 {downloader} 标签回填完成，"
+                            f"扫描 {scanned} 个种子，更新 {changed} 个种子")
+        finally:
+            self._backfill_lock.release()
+
+    def __backfill_page(self, service: Any, downloader: str, rules: TagRules,
+                        site_names: Dict[str, str], torrents: list) -> int:
+        """
+        一页种子的标签差异按 缺少的标签（tr 还需按原标签）分组批量提交，返回更新的种子数
+        """
+        groups: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[str]] = {}
+        for torrent in torrents:
+            domain = StringUtils.get_url_domain(torrent.tracker) if torrent.tracker else None
+            site = site_names.get(domain) or domain
+            desired = rules.resolve(torrent.name, site, torrent.category, torrent.save_path)
+            missing = tuple(tag for tag in desired if tag not in torrent.tags)
+            if not missing:
+                continue
+            org_tags = () if service.type == "qbittorrent" else tuple(sorted(torrent.tags))
+            groups.setdefault((missing, org_tags), []).append(torrent.hash)
+        changed = 0
+        for (missing, org_tags), ids in groups.items():
+            if service.type == "qbittorrent":
+                ok = service.instance.set_torrents_tag(ids=ids, tags=list(missing)) is not False
+            else:
+                ok = self.__set_tr_tags(service.instance, downloader, ids, list(missing), org_tags)
+            if not ok:
+                # 失败的种子记入日志，由重放任务稍后补打
+                logger.warning(f"{self.LOG_TAG} 下载器 {downloader} 补打标签 {list(missing)} 失败，"
+                               f"{len(ids)} 个种子稍后重试")
+                if self._journal:
+                    self._journal.record(downloader, [(_hash, list(missing)) for _hash in ids])
+                continue
+            changed += len(ids)
+        return changed
+
+    def __load_contents(self, downloader: str, hashes: List[str]) -> Optional[Contents]:
+        """
+        批量查询种子名称及文件列表
+        tr 一次请求取回全部字段；qb 没有批量文件列表接口，名称一次查询，文件列表并发查询
+        """
+        service = self.downloader_helper.get_service(downloader)
+        if not service or not service.instance or service.instance.is_inactive():
+            return None
+        try:
+            if service.type == "qbittorrent":
+                qbc = service.instance.qbc
+                names = {torrent.get("hash"): torrent.get("name")
+                         for torrent in qbc.torrents_info(torrent_hashes="|".join(hashes))}
+
+                def _files(_hash: str) -> List[str]:
+                    return [f.get("name") for f in qbc.torrents_files(torrent_hash=_hash)]
+
+                with ThreadPoolExecutor(max_workers=min(8, len(names) or 1)) as executor:
+                    files = list(executor.map(_files, names.keys()))
+                return {_hash: (names[_hash], file_list) for _hash, file_list in zip(names.keys(), files)}
+            # get_files() 同时读取 priorities、wanted 字段，缺少时会出错
+            torrents = service.instance.trc.get_torrents(ids=hashes,
+                                                         arguments=["hashString", "name", "files", "priorities", "wanted"])
+            return {torrent.hashString: (torrent.name, [f.name for f in torrent.get_files()]) for torrent in torrents}
+        except Exception as err:
+            logger.error(f"{self.LOG_TAG} 获取下载器 {downloader} 种子文件列表出错：{err}")
+            return None
+
+    def __load_hashes(self, downloader: str) -> Optional[Set[str]]:
+        """
+        一次性拉取下载器全部种子的 hash
+        """
+        service = self.downloader_helper.get_service(downloader)
+        if not service or not service.instance or service.instance.is_inactive():
+            return None
+        try:
+            if service.type == "qbittorrent":
+                return {torrent.get("hash").lower() for torrent in service.instance.qbc.torrents_info()}
+            torrents = service.instance.trc.get_torrents(arguments=["hashString"])
+            return {torrent.hashString.lower() for torrent in torrents}
+        except Exception as err:
+            logger.error(f"{self.LOG_TAG} 获取下载器 {downloader} 种子列表出错：{err}")
+            return None
+
+    @eventmanager.register(EventType.DownloadDeleted)
+    def listen_download_deleted_event(self, event: Event = None):
+        """
+        删除的种子从种子索引中移除
+        """
+        if not event or not event.event_data or not self._hash_index:
+            return
+        event_data = event.event_data if isinstance(event.event_data, dict) else event.event_data.dict()
+        self._hash_index.discard(event_data.get("hash"), event_data.get("downloader"))
 
+    def __load_labels(self, downloader: str, hashes: Optional[List[str]] = None) -> Optional[Labels]:
+        """
+        查询 Transmission 种子标签，只取 hashString、labels 字段
+        """
+        service = self.downloader_helper.get_service(downloader)
+        if not service or not service.instance or service.instance.is_inactive():
+            return None
+        trc = getattr(service.instance, "trc", None)
+        if not trc:
+            return None
+        try:
+            torrents = trc.get_torrents(ids=hashes, arguments=["hashString", "labels"])
+        except Exception as err:
+            logger.error(f"{self.LOG_TAG} 查询下载器 {downloader} 种子标签出错：{err}")
+            return None
+        return {torrent.hashString: frozenset(torrent.labels or []) for torrent in torrents}
+
+    def reconcile_labels(self):
+        """
+        定时与下载器对账标签索引
+        """
+        if self._labels_index:
+            self._labels_index.reconcile()
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         # 获取所有下载器配置
@@ -118,7 +532,7 @@ class DownloaderTagAdder(_PluginBase):
                                     "model": f"{dl.name}_custom_tags",
                                     "label": f"{dl.name} - 自定义标签",
                                     "rows": 3,
-                                    "placeholder": "每行一个标签\n例如：\n电影\n剧集\n动漫",
+                                    "placeholder": "每行一个，无条件标签直接填写，条件标签为 正则:标签\n例如：\n电影\n^HDSky:高清\n2160p:4K",
                                 },
                             }
                         ]
@@ -137,7 +551,7 @@ class DownloaderTagAdder(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    # 'md': 6
+                                    'md': 4
                                 },
                                 'content': [
                                     {
@@ -148,6 +562,39 @@ class DownloaderTagAdder(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'onlyonce',
+                                            'label': '立即回填已有种子标签',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'fanout',
+                                            'label': '跨下载器同步标签',
+                                            'hint': '所选下载器中辅种的同一种子一并添加标签'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -173,6 +620,151 @@ class DownloaderTagAdder(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 3},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'coalesce_window',
+                                            'label': '合并时间窗口(秒)',
+                                            'type': 'number',
+                                            'hint': '窗口内同一下载器、相同标签的种子合并为一次请求'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 3},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'coalesce_size',
+                                            'label': '单次合并种子数',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 3},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'workers',
+                                            'label': '工作线程数',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 3},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'queue_size',
+                                            'label': '任务队列长度',
+                                            'type': 'number',
+                                            'hint': '队列满时事件最多等待 5 秒'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 6},
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'content_tags',
+                                            'label': '按种子内容添加标签',
+                                            'hint': '根据名称及文件列表添加分辨率、编码、季包/单集、原盘标签'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 6},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'content_cache_size',
+                                            'label': '内容识别缓存种子数',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 4},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'backfill_interval',
+                                            'label': '回填周期(小时)',
+                                            'type': 'number',
+                                            'hint': '0 为不定时回填，仅处理所选下载器'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 4},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'backfill_page_size',
+                                            'label': '回填每页种子数',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {'cols': 12, 'md': 4},
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'backfill_delay',
+                                            'label': '回填每页间隔(秒)',
+                                            'type': 'number',
+                                            'hint': '控制对下载器的请求频率'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     # 添加下载器独立配置表单
                     *downloader_forms,
                     {
@@ -189,7 +781,7 @@ class DownloaderTagAdder(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '每行配置一个，只会匹配一个，行数越高优先级越高。注意！！需用英文的:。'
+                                            'text': '每行配置一个，条件标签格式为 正则:标签，匹配种子名称、站点、分类、保存路径，只会匹配一个，越靠前的行优先级越高；不含 : 的行为无条件标签。注意！！需用英文的:。'
                                         }
                                     }
                                 ]
@@ -203,6 +795,16 @@ class DownloaderTagAdder(_PluginBase):
             "onlyonce": False,
             "cover": False,
             "site_first": False,
+            "coalesce_window": 2,
+            "coalesce_size": 50,
+            "fanout": False,
+            "content_tags": False,
+            "content_cache_size": 2000,
+            "workers": 2,
+            "queue_size": 200,
+            "backfill_interval": 0,
+            "backfill_page_size": 500,
+            "backfill_delay": 1,
             # 初始化下载器自定义标签配置
             **{f"{dl.name}_custom_tags": "" for dl in downloader_configs.values()}
         }
@@ -225,6 +827,35 @@ class DownloaderTagAdder(_PluginBase):
         pass
 
 
+    def get_service(self) -> List[Dict[str, Any]]:
+        """
+        注册插件公共服务
+        """
+        if not self._enabled:
+            return []
+        services = [{
+            "id": "DownloaderTagAdderReplayJournal",
+            "name": "下载器离线标签补打",
+            "trigger": "interval",
+            "func": self.replay_journal,
+            "kwargs": {"seconds": 60}
+        }, {
+            "id": "DownloaderTagAdderReconcileLabels",
+            "name": "下载器标签索引对账",
+            "trigger": "interval",
+            "func": self.reconcile_labels,
+            "kwargs": {"minutes": 30}
+        }]
+        if self._backfill_interval > 0:
+            services.append({
+                "id": "DownloaderTagAdderBackfill",
+                "name": "下载器已有种子标签回填",
+                "trigger": "interval",
+                "func": self.backfill_tags,
+                "kwargs": {"hours": self._backfill_interval}
+            })
+        return services
+
     def get_page(self) -> List[dict]:
         pass
 
@@ -234,6 +865,30 @@ class DownloaderTagAdder(_PluginBase):
         """
         try:
             logger.info('尝试停止插件服务...')
+            self._event.set()
+            self.__stop_workers()
+            if self._labels_index:
+                self._labels_index.clear()
+            if self._hash_index:
+                self._hash_index.clear()
+            if self._content_tagger:
+                self._content_tagger.clear()
             logger.info('插件服务停止完成')
         except Exception as e:
-            logger.error(f"插件服务停止异常: {str(e)}", exc_info=True)
\ No newline at end of file
+            logger.error(f"插件服务停止异常: {str(e)}", exc_info=True)
+
+    def __stop_workers(self):
+        """
+        依次处理完队列中的事件、提交合并缓冲区中的剩余请求，再结束工作线程并关闭日志
+        """
+        if self._pool:
+            self._pool.drain()
+        if self._coalescer:
+            self._coalescer.stop()
+            self._coalescer = None
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+        if self._journal:
+            self._journal.close()
+            self._journal = None
@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from typing import Any, FrozenSet, Iterator, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class TorrentTags:
+    """
+    回填时需要的种子信息
+    """
+    hash: str
+    name: str
+    tracker: Optional[str]
+    category: Optional[str]
+    save_path: Optional[str]
+    tags: FrozenSet[str]
+
+
+def iter_qbittorrent(qbc: Any, page_size: int, offset: int = 0) -> Iterator[Tuple[int, List[TorrentTags]]]:
+    """
+    按添加时间分页读取 qBittorrent 种子，返回 (下一页偏移, 本页种子)
+    新添加的种子排在最后，中途中断后可从偏移处继续
+    """
+    while True:
+        torrents = qbc.torrents_info(sort="added_on", limit=page_size, offset=offset)
+        if not torrents:
+            return
+        offset += len(torrents)
+        yield offset, [TorrentTags(hash=torrent.get("hash"),
+                                   name=torrent.get("name"),
+                                   tracker=torrent.get("tracker"),
+                                   category=torrent.get("category"),
+                                   save_path=torrent.get("save_path"),
+                                   tags=frozenset(tag.strip() for tag in (torrent.get("tags") or "").split(",")
+                                                  if tag.strip()))
+                       for torrent in torrents]
+        if len(torrents) < page_size:
+            return
+
+
+def iter_transmission(trc: Any, page_size: int, last_id: int = 0) -> Iterator[Tuple[int, List[TorrentTags]]]:
+    """
+    按种子ID分页读取 Transmission 种子，返回 (本页最大ID, 本页种子)
+    Transmission 不支持分页查询，先只取 id 字段，再按ID分批查询需要的字段
+    """
+    ids = sorted(torrent.id for torrent in trc.get_torrents(arguments=["id"]) if torrent.id > last_id)
+    for i in range(0, len(ids), page_size):
+        page = ids[i:i + page_size]
+        torrents = trc.get_torrents(ids=page,
+                                    arguments=["id", "hashString", "name", "labels", "downloadDir", "trackers"])
+        yield page[-1], [TorrentTags(hash=torrent.hashString,
+                                     name=torrent.name,
+                                     tracker=_first_tracker(torrent),
+                                     category=None,
+                                     save_path=torrent.download_dir,
+                                     tags=frozenset(torrent.labels or []))
+                         for torrent in torrents]
+
+
+def _first_tracker(torrent: Any) -> Optional[str]:
+    try:
+        trackers = torrent.trackers
+    except (AttributeError, KeyError):
+        return None
+    return trackers[0].announce if trackers else None
@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+# 分组：(下载器, 标签)
+GroupKey = Tuple[str, Tuple[str, ...]]
+
+
+class TagCoalescer:
+    """
+    合并打标签请求
+    同一下载器、同一组标签的种子在时间窗口内合并，窗口到期或数量达到上限时由后台线程一次提交，
+    事件线程只负责登记，不等待下载器请求
+    """
+
+    def __init__(self, flush: Callable[[str, List[str], List[str]], None],
+                 window: float = 2.0, max_size: int = 50):
+        """
+        :param flush: 提交一组种子，参数为 (下载器, 标签, 种子hash列表)
+        :param window: 合并时间窗口（秒）
+        :param max_size: 单组最多合并的种子数
+        """
+        self._flush = flush
+        self._window = window
+        self._max_size = max(1, max_size)
+        self._cond = threading.Condition()
+        # 分组 -> (首个种子登记时间, 种子hash列表)
+        self._groups: Dict[GroupKey, Tuple[float, List[str]]] = {}
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name="DownloaderTagAdder-coalescer", daemon=True)
+        self._thread.start()
+
+    def add(self, downloader: str, _hash: str, tags: List[str]):
+        """
+        登记待打标签的种子
+        """
+        key = (downloader, tuple(tags))
+        with self._cond:
+            created = key not in self._groups
+            created_at, hashes = self._groups.setdefault(key, (time.monotonic(), []))
+            if _hash not in hashes:
+                hashes.append(_hash)
+            # 新分组需要唤醒后台线程按窗口重新计算等待时间
+            if created or len(hashes) >= self._max_size:
+                self._cond.notify()
+
+    def __due(self, force: bool = False) -> List[Tuple[GroupKey, List[str]]]:
+        """
+        取出已到期或已满的分组
+        """
+        now = time.monotonic()
+        due = [key for key, (created_at, hashes) in self._groups.items()
+               if force or len(hashes) >= self._max_size or now - created_at >= self._window]
+        return [(key, self._groups.pop(key)[1]) for key in due]
+
+    def __next_timeout(self) -> Optional[float]:
+        if not self._groups:
+            return None
+        oldest = min(created_at for created_at, _ in self._groups.values())
+        return max(0.0, self._window - (time.monotonic() - oldest))
+
+    def __run(self):
+        while True:
+            final = False
+            with self._cond:
+                while not self._stopped:
+                    batches = self.__due()
+                    if batches:
+                        break
+                    self._cond.wait(self.__next_timeout())
+                else:
+                    final = True
+                    batches = self.__due(force=True)
+            for (downloader, tags), hashes in batches:
+                for i in range(0, len(hashes), self._max_size):
+                    try:
+                        self._flush(downloader, list(tags), hashes[i:i + self._max_size])
+                    except Exception as err:
+                        logger.error(f"下载器 {downloader} 批量添加标签出错：{err}")
+            if final:
+                return
+
+    def stop(self, timeout: float = 10):
+        """
+        提交剩余的分组后退出
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
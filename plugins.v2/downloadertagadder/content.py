@@ -0,0 +1,105 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+# 种子hash -> (种子名称, 文件路径列表)
+Contents = Dict[str, Tuple[str, List[str]]]
+
+_VIDEO = re.compile(r"^.*\.(?:mkv|mp4|ts|m2ts|avi|wmv|mov|flv|rmvb|webm)$", re.IGNORECASE | re.MULTILINE)
+_DISC = re.compile(r"(?:^|/)(?:BDMV|VIDEO_TS|CERTIFICATE)(?:/|$)|\.iso$", re.IGNORECASE | re.MULTILINE)
+_RESOLUTIONS = [
+    ("4K", re.compile(r"2160[pi]|\b4K\b|\bUHD\b", re.IGNORECASE)),
+    ("1080p", re.compile(r"1080[pi]", re.IGNORECASE)),
+    ("720p", re.compile(r"720p", re.IGNORECASE)),
+]
+_CODECS = [
+    ("HEVC", re.compile(r"[xh]\.?265|\bHEVC\b", re.IGNORECASE)),
+    ("AV1", re.compile(r"\bAV1\b", re.IGNORECASE)),
+    ("H264", re.compile(r"[xh]\.?264|\bAVC\b", re.IGNORECASE)),
+]
+# E、EP 前须为 S01 或分隔符，避免匹配单词中间的 E
+_EPISODE = re.compile(r"(?:\bS\d{1,2}|(?<![A-Za-z\d]))E[Pp]?(\d{1,4})\b|第\s*(\d{1,4})\s*[集话話]", re.IGNORECASE)
+_SEASON = re.compile(r"\bS\d{1,2}\b(?!\s*E)|第\s*[\d一二三四五六七八九十]+\s*季|Complete", re.IGNORECASE)
+
+
+def classify(name: str, files: List[str]) -> List[str]:
+    """
+    根据种子名称及文件列表识别分辨率、编码、季包/单集、原盘
+    文件列表拼接为一段文本，每个分类器只对整段文本匹配一次
+    """
+    tags = []
+    text = "\n".join(files or [])
+    videos = "\n".join(_VIDEO.findall(text))
+    subject = f"{name or ''}\n{videos}"
+    for tag, pattern in _RESOLUTIONS:
+        if pattern.search(subject):
+            tags.append(tag)
+            break
+    for tag, pattern in _CODECS:
+        if pattern.search(subject):
+            tags.append(tag)
+            break
+    if _DISC.search(text):
+        tags.append("原盘")
+    else:
+        episodes = {ep or cn for ep, cn in _EPISODE.findall(videos)}
+        if len(episodes) > 1 or (not episodes and _SEASON.search(name or "")):
+            tags.append("季包")
+        elif episodes or _EPISODE.search(name or ""):
+            tags.append("单集")
+    return tags
+
+
+class ContentTagger:
+    """
+    按种子内容生成标签
+    一批种子中未缓存的合并为一次元数据查询，识别结果按 infohash 缓存在有界 LRU 中；
+    同一种子在不同下载器中内容相同，缓存不区分下载器
+    """
+
+    def __init__(self, loader: Callable[[str, List[str]], Optional[Contents]], max_items: int = 2000):
+        """
+        :param loader: 批量查询种子名称及文件列表，参数为 (下载器, 种子hash列表)，失败返回 None
+        :param max_items: 最多缓存的种子数
+        """
+        self._loader = loader
+        self._max_items = max(1, max_items)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()
+
+    def tags_for(self, downloader: str, hashes: List[str]) -> Dict[str, List[str]]:
+        """
+        返回每个种子的内容标签，查询失败的种子不在结果中
+        """
+        result: Dict[str, List[str]] = {}
+        with self._lock:
+            for _hash in hashes:
+                tags = self._cache.get(_hash.lower())
+                if tags is not None:
+                    self._cache.move_to_end(_hash.lower())
+                    result[_hash] = tags
+        missing = [_hash for _hash in hashes if _hash not in result]
+        if not missing:
+            return result
+        contents = self._loader(downloader, missing)
+        if contents is None:
+            logger.warning(f"获取下载器 {downloader} 种子文件列表失败")
+            return result
+        with self._lock:
+            for _hash, (name, files) in contents.items():
+                tags = classify(name, files)
+                result[_hash] = tags
+                # 元数据尚未下载完成（如磁力链接）时文件列表为空，不缓存，下次重新识别
+                if files:
+                    self._cache[_hash.lower()] = tags
+                    self._cache.move_to_end(_hash.lower())
+            while len(self._cache) > self._max_items:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
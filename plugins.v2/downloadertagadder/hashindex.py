@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Set
+
+from app.log import logger
+
+
+class HashIndex:
+    """
+    下载器 -> 已有种子 hash 集合，用于判断同一种子在哪些下载器中辅种
+    每个下载器首次查询时全量拉取一次，之后由下载事件增量维护，超过有效期后重新拉取
+    """
+
+    def __init__(self, loader: Callable[[str], Optional[Set[str]]], ttl: int = 1800):
+        """
+        :param loader: 按下载器名称返回全部种子 hash，失败返回 None
+        :param ttl: 全量列表有效期（秒）
+        """
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._hashes: Dict[str, Set[str]] = {}
+        self._built_at: Dict[str, float] = {}
+
+    def __fresh(self, downloader: str) -> bool:
+        return time.time() - self._built_at.get(downloader, 0) <= self._ttl
+
+    def __ensure(self, downloader: str) -> Optional[Set[str]]:
+        with self._lock:
+            if self.__fresh(downloader):
+                return self._hashes.get(downloader)
+            build_lock = self._build_locks.setdefault(downloader, threading.Lock())
+        # 同一下载器只拉取一次，其它线程等待结果
+        with build_lock:
+            with self._lock:
+                if self.__fresh(downloader):
+                    return self._hashes.get(downloader)
+            hashes = self._loader(downloader)
+            if hashes is None:
+                return None
+            with self._lock:
+                self._hashes[downloader] = hashes
+                self._built_at[downloader] = time.time()
+            logger.debug(f"下载器 {downloader} 种子索引已重建，共 {len(hashes)} 个种子")
+            return hashes
+
+    def contains(self, downloader: str, _hash: str) -> bool:
+        """
+        下载器中是否有该种子，获取种子列表失败时视为没有
+        """
+        if not downloader or not _hash:
+            return False
+        hashes = self.__ensure(downloader)
+        return bool(hashes) and _hash.lower() in hashes
+
+    def add(self, downloader: str, _hash: str):
+        if not downloader or not _hash:
+            return
+        with self._lock:
+            if downloader in self._hashes:
+                self._hashes[downloader].add(_hash.lower())
+
+    def discard(self, _hash: str, downloader: Optional[str] = None):
+        """
+        移除种子，未指定下载器时从所有下载器中移除
+        """
+        if not _hash:
+            return
+        with self._lock:
+            for name, hashes in self._hashes.items():
+                if not downloader or name == downloader:
+                    hashes.discard(_hash.lower())
+
+    def clear(self):
+        with self._lock:
+            self._hashes.clear()
+            self._built_at.clear()
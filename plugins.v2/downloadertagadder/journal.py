@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from app.log import logger
+
+
+class TagJournal:
+    """
+    基于 SQLite 的待打标签日志
+    下载器离线或写入失败时记录种子及需要添加的标签，同一下载器同一种子只保留一条，标签取并集；
+    下载器恢复后批量补打，多次补打仍失败的记录丢弃
+    """
+
+    def __init__(self, path: Path, max_attempts: int = 10):
+        """
+        :param path: 数据库文件路径
+        :param max_attempts: 补打失败多少次后丢弃
+        """
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pending (
+                downloader TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                tags TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (downloader, hash)
+            );
+        """)
+
+    @contextmanager
+    def __transaction(self, begin: str = "BEGIN"):
+        """
+        记录、重试的事务，出错时回滚，否则离线期间的标签再也无法记入日志
+        """
+        self._conn.execute(begin)
+        try:
+            yield
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, downloader: str, items: List[Tuple[str, List[str]]]):
+        """
+        记录待打标签的种子，已有记录时合并标签
+        :param items: (种子hash, 标签)
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            with self.__transaction():
+                for _hash, tags in items:
+                    row = self._conn.execute("SELECT tags FROM pending WHERE downloader = ? AND hash = ?",
+                                             (downloader, _hash)).fetchone()
+                    merged = self.__split(row[0]) if row else []
+                    merged += [tag for tag in tags if tag not in merged]
+                    self._conn.execute(
+                        "INSERT INTO pending (downloader, hash, tags, created_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (downloader, hash) DO UPDATE SET tags = excluded.tags",
+                        (downloader, _hash, "\n".join(merged), now))
+        logger.info(f"下载器 {downloader} 有 {len(items)} 个种子待补打标签")
+
+    def downloaders(self) -> List[str]:
+        """
+        有待补打记录的下载器
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT downloader FROM pending")]
+
+    def has(self, downloader: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM pending WHERE downloader = ? LIMIT 1",
+                                      (downloader,)).fetchone() is not None
+
+    def pending(self, downloader: str, limit: int = 500) -> Dict[Tuple[str, ...], List[str]]:
+        """
+        按标签分组取出待补打的种子，标签相同的种子可以一次提交
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hash, tags FROM pending WHERE downloader = ? ORDER BY created_at LIMIT ?",
+                (downloader, limit)).fetchall()
+        groups: Dict[Tuple[str, ...], List[str]] = {}
+        for _hash, tags in rows:
+            groups.setdefault(tuple(self.__split(tags)), []).append(_hash)
+        return groups
+
+    def remove(self, downloader: str, hashes: List[str]):
+        """
+        补打成功后删除记录
+        """
+        if not hashes:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending WHERE downloader = ? AND hash = ?",
+                                   [(downloader, _hash) for _hash in hashes])
+
+    def retry(self, downloader: str, hashes: List[str]):
+        """
+        补打失败，累计失败次数，超过上限的记录丢弃
+        """
+        if not hashes:
+            return
+        with self._lock:
+            with self.__transaction():
+                self._conn.executemany("UPDATE pending SET attempts = attempts + 1 WHERE downloader = ? AND hash = ?",
+                                       [(downloader, _hash) for _hash in hashes])
+                dropped = self._conn.execute("DELETE FROM pending WHERE downloader = ? AND attempts >= ?",
+                                             (downloader, self._max_attempts)).rowcount
+        if dropped:
+            logger.warning(f"下载器 {downloader} 有 {dropped} 个种子多次补打标签失败，已放弃")
+
+    @staticmethod
+    def __split(tags: str) -> List[str]:
+        return [tag for tag in (tags or "").split("\n") if tag]
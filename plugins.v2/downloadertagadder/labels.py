@@ -0,0 +1,114 @@
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.log import logger
+
+# 种子hash -> 标签
+Labels = Dict[str, FrozenSet[str]]
+
+
+class LabelsIndex:
+    """
+    Transmission 种子标签的本地索引，按下载器分别维护
+    首次使用时通过一次只取 hashString、labels 字段的批量查询建立，之后由本插件的写入实时更新，
+    并定时全量对账，追加标签时不需要先查询原标签；
+    重建期间的写入另行记录，重建完成后覆盖到新索引上，避免查询时刻之前的快照覆盖刚写入的标签
+    """
+
+    def __init__(self, loader: Callable[[str, Optional[List[str]]], Optional[Labels]]):
+        """
+        :param loader: 查询下载器的种子标签，参数为 (下载器, 种子hash列表)，hash列表为 None 时查询全部，失败返回 None
+        """
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._index: Dict[str, Labels] = {}
+        # 正在重建的下载器 -> (进行中的重建数, 重建期间的变更，None 表示移除)
+        self._rebuilding: Dict[str, Tuple[int, Dict[str, Optional[FrozenSet[str]]]]] = {}
+
+    def lookup(self, downloader: str, hashes: Iterable[str]) -> Optional[Labels]:
+        """
+        查询种子的原标签，索引中没有的种子（如刚添加的种子）合并为一次查询补齐
+        查询失败返回 None
+        """
+        hashes = list(hashes)
+        with self._lock:
+            seeded = downloader in self._index
+        if not seeded and not self.rebuild(downloader):
+            return None
+        with self._lock:
+            index = self._index.get(downloader, {})
+            found = {_hash: index[_hash] for _hash in hashes if _hash in index}
+        missing = [_hash for _hash in hashes if _hash not in found]
+        if missing:
+            fetched = self._loader(downloader, missing)
+            if fetched is None:
+                return None
+            self.update(downloader, fetched)
+            found.update(fetched)
+        return found
+
+    def update(self, downloader: str, labels: Labels):
+        """
+        写入成功后更新索引
+        """
+        with self._lock:
+            self._index.setdefault(downloader, {}).update(labels)
+            if downloader in self._rebuilding:
+                self._rebuilding[downloader][1].update(labels)
+
+    def discard(self, downloader: str, hashes: Iterable[str]):
+        """
+        写入失败或种子删除后移出索引，下次使用时重新查询
+        """
+        with self._lock:
+            changes = self._rebuilding[downloader][1] if downloader in self._rebuilding else None
+            index = self._index.get(downloader)
+            for _hash in hashes:
+                if index is not None:
+                    index.pop(_hash, None)
+                if changes is not None:
+                    changes[_hash] = None
+
+    def rebuild(self, downloader: str) -> bool:
+        """
+        全量重建下载器的标签索引
+        """
+        with self._lock:
+            count, changes = self._rebuilding.get(downloader, (0, {}))
+            self._rebuilding[downloader] = (count + 1, changes)
+        labels = None
+        try:
+            labels = self._loader(downloader, None)
+        finally:
+            with self._lock:
+                count, changes = self._rebuilding[downloader]
+                if count > 1:
+                    self._rebuilding[downloader] = (count - 1, changes)
+                else:
+                    del self._rebuilding[downloader]
+                if labels is not None:
+                    index = dict(labels)
+                    for _hash, tags in changes.items():
+                        if tags is None:
+                            index.pop(_hash, None)
+                        else:
+                            index[_hash] = tags
+                    self._index[downloader] = index
+        if labels is None:
+            logger.warning(f"下载器 {downloader} 标签索引建立失败")
+            return False
+        logger.debug(f"下载器 {downloader} 标签索引已建立，共 {len(labels)} 个种子")
+        return True
+
+    def reconcile(self):
+        """
+        定时对账，重建已使用过的下载器索引，修正下载器端被其它程序修改的标签
+        """
+        with self._lock:
+            downloaders = list(self._index.keys())
+        for downloader in downloaders:
+            self.rebuild(downloader)
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
@@ -0,0 +1,112 @@
+import re
+from typing import List, Optional, Tuple
+
+from app.log import logger
+
+# 正则元字符，不含这些字符的规则按普通字符串查找
+_META = re.compile(r"[.^$*+?{}\[\]\\|()]")
+_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+class TagRules:
+    """
+    条件标签规则
+    每行一条，格式为 `正则:标签`，匹配种子名称、站点、分类、保存路径中的任意一项；没有 `:` 的行为无条件标签。
+    规则在加载时编译：普通字符串规则直接做子串查找，其余规则合并为一个正则，每条规则是一个从开头出发的前瞻分支，
+    分支按行顺序尝试；两者取行号最小的命中规则，即靠前的规则优先
+    """
+
+    def __init__(self, lines: List[str]):
+        # 无条件标签
+        self.tags: List[str] = []
+        # 条件规则：(正则, 标签)
+        self.rules: List[Tuple[str, str]] = []
+        # 普通字符串规则：(行号, 小写字符串)
+        self._literals: List[Tuple[int, str]] = []
+        # 合并后的正则及分支对应的行号
+        self._matcher: Optional[re.Pattern] = None
+        self._branches: List[int] = []
+        for line in lines or []:
+            line = line.strip()
+            if not line:
+                continue
+            pattern, sep, tag = line.rpartition(":")
+            pattern, tag = pattern.strip(), tag.strip()
+            if not sep or not pattern:
+                if tag:
+                    self.tags.append(tag)
+                continue
+            if not tag:
+                logger.warning(f"标签规则 {line} 未配置标签，已忽略")
+                continue
+            try:
+                re.compile(pattern)
+            except re.error as err:
+                logger.warning(f"标签规则 {line} 正则有误：{err}，已忽略")
+                continue
+            self.rules.append((pattern, tag))
+        self.__compile()
+
+    def __compile(self):
+        patterns = []
+        for i, (pattern, _) in enumerate(self.rules):
+            if _META.search(pattern):
+                self._branches.append(i)
+                patterns.append(pattern)
+            else:
+                self._literals.append((i, pattern.lower()))
+        if not patterns:
+            return
+        if any(re.search(r"\\[1-9]", pattern) for pattern in patterns):
+            # 编号反向引用在合并后组号会变化，逐条匹配
+            return
+        # 字段以换行分隔，`.` 不会跨字段，多行模式下 ^ $ 对每个字段生效
+        branches = "|".join(f"(?=[\\s\\S]*?(?:{pattern}))(?P<r{n}>)" for n, pattern in enumerate(patterns))
+        try:
+            self._matcher = re.compile(f"\\A(?:{branches})", _FLAGS)
+        except re.error as err:
+            # 单条规则均可编译但合并失败（如多条规则使用了同名分组），退化为逐条匹配
+            logger.warning(f"标签规则合并编译失败：{err}，将逐条匹配")
+            self._matcher = None
+
+    def __match_regex(self, subject: str, before: int) -> Optional[int]:
+        """
+        返回命中的正则规则中行号最小的，只考虑行号小于 before 的规则
+        """
+        if not self._branches or self._branches[0] >= before:
+            return None
+        if self._matcher:
+            matched = self._matcher.match(subject)
+            return self._branches[int(matched.lastgroup[1:])] if matched else None
+        for i in self._branches:
+            if i >= before:
+                break
+            if re.search(self.rules[i][0], subject, _FLAGS):
+                return i
+        return None
+
+    def match(self, *fields: Optional[str]) -> Optional[str]:
+        """
+        返回第一条命中的规则的标签
+        """
+        if not self.rules:
+            return None
+        subject = "\n".join(str(field).replace("\n", " ") for field in fields if field)
+        if not subject:
+            return None
+        lowered = subject.lower()
+        best = next((i for i, literal in self._literals if literal in lowered), len(self.rules))
+        regex = self.__match_regex(subject, best)
+        if regex is not None and regex < best:
+            best = regex
+        return self.rules[best][1] if best < len(self.rules) else None
+
+    def resolve(self, *fields: Optional[str]) -> List[str]:
+        """
+        无条件标签加上命中的条件标签
+        """
+        tags = list(self.tags)
+        tag = self.match(*fields)
+        if tag and tag not in tags:
+            tags.append(tag)
+        return tags
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List
+
+from app.log import logger
+
+
+class WorkerPool:
+    """
+    有界工作线程池
+    任务队列满时提交方最多等待 put_timeout 秒（背压），仍无空位则放弃该任务；
+    退出时先等待队列中的任务执行完，再结束工作线程
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 200, put_timeout: float = 5,
+                 name: str = "DownloaderTagAdder-worker"):
+        """
+        :param workers: 工作线程数
+        :param queue_size: 任务队列长度
+        :param put_timeout: 队列满时提交方最长等待时间（秒）
+        """
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self._put_timeout = put_timeout
+        self._cond = threading.Condition()
+        # 已提交未完成的任务数
+        self._pending = 0
+        self._threads: List[threading.Thread] = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self.__run, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func: Callable, *args: Any) -> bool:
+        """
+        提交任务，返回是否进入队列
+        """
+        with self._cond:
+            self._pending += 1
+        try:
+            self._queue.put((func, args), timeout=self._put_timeout)
+            return True
+        except queue.Full:
+            self.__done()
+            logger.warning(f"任务队列已满（{self._queue.maxsize}），放弃任务 {getattr(func, '__name__', func)}")
+            return False
+
+    def __done(self):
+        with self._cond:
+            self._pending -= 1
+            if self._pending <= 0:
+                self._cond.notify_all()
+
+    def __run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            self.__execute(task)
+
+    def __execute(self, task: tuple):
+        func, args = task
+        try:
+            func(*args)
+        except Exception as err:
+            logger.error(f"执行任务 {getattr(func, '__name__', func)} 出错：{err}", exc_info=True)
+        finally:
+            self.__done()
+
+    def drain(self, timeout: float = 30) -> bool:
+        """
+        等待已提交的任务全部执行完，返回是否在超时前完成
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"仍有 {self._pending} 个任务未完成")
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float = 30):
+        """
+        执行完剩余任务后结束工作线程
+        """
+        self.drain(timeout)
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=1)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(1)
+        # 与退出并发提交、排在结束标记之后的任务在当前线程执行，不丢弃
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                self.__execute(task)
@@ -1,4 +1,8 @@
-from typing import Any, List, Dict, Tuple, Optional
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, List, Dict, Tuple, Optional, Set, Union
 
 from app.core.event import eventmanager, Event
 from app.db.site_oper import SiteOper
@@ -10,6 +14,16 @@ from app.schemas import ServiceInfo
 from app.helper.downloader import DownloaderHelper
 from app.helper.directory import DirectoryHelper
 
+from .admission import SpaceGuard
+from .hashindex import HashIndex
+from .health import DownloaderHealth
+from .jobqueue import JobQueue
+from .pipeline import AddRequest, BatchPipeline, TaskStatus
+from .prefetch import ABORTED, TorrentCache, TorrentFetcher
+from .ratelimit import SiteRateLimiter
+from .routing import DownloaderLoad, LoadRouter
+from .siteindex import SiteIndex
+
 # fork from https://github.com/thsrite/MoviePilot-Plugins/tree/main/plugins.v2/downloadtorrent
 class DownloadTorrentPlus(_PluginBase):
     # 插件名称
@@ -19,7 +33,7 @@ class DownloadTorrentPlus(_PluginBase):
     # 插件图标
     plugin_icon = "world.png"
     # 插件版本
-    plugin_version = "1.0.0"
+    plugin_version = "1.10.0"
     # 插件作者
     plugin_author = "velor2012"
     # 作者主页
@@ -37,15 +51,48 @@ class DownloadTorrentPlus(_PluginBase):
     _save_path = None
     _mp_path = None
     _downloader = None
+    _max_workers = 4
+    _site_workers = 2
+    _batch_add = False
+    _batch_size = 20
+    _prefetch = False
+    _prefetch_cache_mb = 64
+    _fetcher: Optional[TorrentFetcher] = None
+    _space_check = False
+    _min_free_gb = 10
+    _space_policy = "defer"
+    _space_guard: Optional[SpaceGuard] = None
+    # qbittorrent 增量同步状态：下载器 -> (rid, 剩余空间)
+    _maindata: Dict[str, Tuple[int, Optional[int]]] = {}
+    _maindata_lock = threading.Lock()
+    _route_mode = "fixed"
+    _route_downloaders: List[str] = []
+    _router: Optional[LoadRouter] = None
+    _rate_limit = 1.0
+    _rate_burst = 5
+    _limiter: Optional[SiteRateLimiter] = None
+    _health: Optional[DownloaderHealth] = None
+    # 退出事件
+    _event: Optional[threading.Event] = None
+    _queue: Optional[JobQueue] = None
+    _pipeline: Optional[BatchPipeline] = None
+    _site_index: Optional[SiteIndex] = None
+    _hash_index: Optional[HashIndex] = None
     site = None
     torrent_helper = None
     downloader_helper = None
     directory_helper = None
 
     def init_plugin(self, config: dict = None):
+        # 保存配置时会重新初始化，先停止上次的流水线及队列，避免执行中的任务被恢复后重复添加
+        self.stop_service()
         self.downloader_helper = DownloaderHelper()
         self.directory_helper = DirectoryHelper()
         self.site = SiteOper()
+        self._site_index = SiteIndex(loader=self.site.list)
+        self._hash_index = HashIndex(loader=self.__load_torrent_hashes)
+        self._event = threading.Event()
+        self._health = DownloaderHealth(checker=self.__check_downloader)
 
         if config:
             self._enabled = config.get("enabled")
@@ -56,60 +103,510 @@ class DownloadTorrentPlus(_PluginBase):
             self._custom_tags = config.get("custom_tags")
             self._custom_category = config.get("custom_category")
             self._downloader = config.get("downloader")
+            self._max_workers = self.__to_int(config.get("max_workers"), 4)
+            self._site_workers = self.__to_int(config.get("site_workers"), 2)
+            self._batch_add = config.get("batch_add")
+            self._batch_size = max(1, self.__to_int(config.get("batch_size"), 20))
+            self._prefetch = config.get("prefetch")
+            self._prefetch_cache_mb = max(1, self.__to_int(config.get("prefetch_cache_mb"), 64))
 
-        
-            # 下载种子
-            if self._torrent_urls:
-                for torrent_url in str(self._torrent_urls).split("\n"):
-                    self.__download_torrent(torrent_url)
+            self._space_check = config.get("space_check")
+            self._min_free_gb = max(0, self.__to_int(config.get("min_free_gb"), 10))
+            self._space_policy = config.get("space_policy") or "defer"
+            self._route_mode = config.get("route_mode") or "fixed"
+            self._route_downloaders = config.get("route_downloaders") or []
+            self._rate_limit = self.__to_float(config.get("rate_limit"), 1.0)
+            self._rate_burst = max(1, self.__to_int(config.get("rate_burst"), 5))
+
+        # 按站点限制请求种子的频率，/dt 命令与批量添加共用
+        self._limiter = SiteRateLimiter(rate=self._rate_limit,
+                                        burst=self._rate_burst,
+                                        site_limits=self.__site_limits,
+                                        stop_event=self._event)
+
+        if self._route_mode == "least_loaded":
+            self._router = LoadRouter(probe=self.__probe_load)
+        else:
+            self._router = None
+
+        # 关闭的功能不再保留上次的实例，旧的种子下载器已在 stop_service 中关闭
+        self._fetcher = None
+        self._space_guard = None
+        if self._prefetch:
+            self._fetcher = TorrentFetcher(cache=TorrentCache(max_bytes=self._prefetch_cache_mb * 1024 * 1024),
+                                           limiter=self._limiter)
+            if self._space_check:
+                self._space_guard = SpaceGuard(probe=self.__free_space,
+                                               min_free=self._min_free_gb * 1024 ** 3)
+        elif self._space_check:
+            logger.warning("检查剩余空间需要开启预先下载种子，未预先下载时无法得知种子大小，本次不检查")
+        with self._maindata_lock:
+            self._maindata = {}
 
+        # 持久化任务队列，恢复上次未完成的任务
+        self._queue = JobQueue(self.get_data_path() / "queue.db")
+        self._queue.purge(before=time.time() - 30 * 24 * 3600)
+        self._pipeline = BatchPipeline(queue=self._queue,
+                                       handler=self.__pipeline_handler,
+                                       key_func=StringUtils.get_url_domain,
+                                       max_workers=self._max_workers,
+                                       site_workers=self._site_workers,
+                                       batch_size=self._batch_size if self._batch_add else 1,
+                                       on_finish=self.__on_job_finish)
+        self._pipeline.start()
+
+        if config:
+            # 下载种子，提交到流水线后立即返回
+            if self._torrent_urls:
+                job_id, total = self._pipeline.submit(str(self._torrent_urls).split("\n"))
+                logger.info(f"批量添加任务 {job_id} 已提交，共 {total} 个种子链接")
 
             self.update_config({
                 "downloader": self._downloader,
                 "save_path": self._save_path,
                 "enabled": self._enabled,
                 "mp_path": self._mp_path,
-                "is_paused": self._is_paused
+                "is_paused": self._is_paused,
+                "custom_tags": self._custom_tags,
+                "custom_category": self._custom_category,
+                "max_workers": self._max_workers,
+                "site_workers": self._site_workers,
+                "batch_add": self._batch_add,
+                "batch_size": self._batch_size,
+                "prefetch": self._prefetch,
+                "prefetch_cache_mb": self._prefetch_cache_mb,
+                "space_check": self._space_check,
+                "min_free_gb": self._min_free_gb,
+                "space_policy": self._space_policy,
+                "route_mode": self._route_mode,
+                "route_downloaders": self._route_downloaders,
+                "rate_limit": self._rate_limit,
+                "rate_burst": self._rate_burst
             })
 
-    def __download_torrent(self, torrent_url: str):
+    @staticmethod
+    def __to_int(value: Any, default: int) -> int:
+        try:
+            return int(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def __to_float(value: Any, default: float) -> float:
+        try:
+            return float(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
+    def __site_limits(self, domain: str) -> Optional[Tuple[float, int]]:
+        """
+        站点管理中设置的流控，换算为 (每秒请求数, 突发请求数)
+        """
+        site = self._site_index.get(domain)
+        if not site:
+            return None
+        if site.limit_seconds:
+            return 1 / site.limit_seconds, 1
+        if site.limit_interval and site.limit_count:
+            return site.limit_count / site.limit_interval, site.limit_count
+        return None
+
+    def __pipeline_handler(self, torrent_urls: List[str]) -> List[Tuple[str, str]]:
+        """
+        流水线处理同一站点的一组种子链接
+        """
+        return [(request.status, request.message) for request in self.__download_torrents(torrent_urls)]
+
+    def __on_job_finish(self, summary: dict):
+        """
+        批量任务完成，通知汇总结果
+        """
+        logger.info(f"批量添加任务 {summary['job_id']} 完成，成功 {summary['added']}，"
+                    f"失败 {summary['failed']}，跳过 {summary['skipped']}")
+        text = f"成功 {summary['added']}，失败 {summary['failed']}，跳过 {summary['skipped']}"
+        if summary["failed_items"]:
+            text += "\n失败：\n" + "\n".join(f"{item['url']} {item['reason']}"
+                                              for item in summary["failed_items"][:10])
+        self.post_message(title=f"批量添加种子任务 {summary['job_id']} 完成", text=text)
+
+    def get_job(self, job_id: str = None) -> Dict[str, Any]:
+        """
+        查询批量添加任务状态，未指定任务ID时返回最近的任务
+        """
+        if not self._queue:
+            return {}
+        if job_id:
+            return self._queue.job_summary(job_id)
+        return {"jobs": [self._queue.job_summary(jid) for jid in self._queue.recent_jobs()]}
+
+    def __download_torrent(self, torrent_url: str) -> Tuple[str, Optional[str], str]:
         """
         下载种子
+        :return: 处理结果、站点名称、说明
+        """
+        request = self.__prepare(torrent_url)
+        try:
+            if not request.status:
+                self.__add(request)
+        finally:
+            self.__release_space([request])
+        return request.status, request.site_name, request.message
+
+    def __download_torrents(self, torrent_urls: List[str]) -> List[AddRequest]:
+        """
+        批量下载种子，qbittorrent 按下载器、保存路径、分类、标签、cookie 分组后合并添加
+        """
+        requests: List[AddRequest] = []
+        try:
+            for torrent_url in torrent_urls:
+                requests.append(self.__prepare(torrent_url))
+            groups: Dict[tuple, List[AddRequest]] = {}
+            for request in requests:
+                if request.status:
+                    continue
+                service = self.service_info(request.downloader)
+                if len(requests) > 1 and self.downloader_helper.is_downloader("qbittorrent", service=service):
+                    groups.setdefault(request.group_key, []).append(request)
+                else:
+                    self.__add(request)
+            for group in groups.values():
+                for i in range(0, len(group), self._batch_size):
+                    self.__add_batch(group[i:i + self._batch_size])
+        finally:
+            self.__release_space(requests)
+        return requests
+
+    def __prepare(self, torrent_url: str) -> AddRequest:
         """
+        解析种子链接，查询站点、去重、选择下载器，得出添加参数
+        """
+        request = AddRequest(url=torrent_url,
+                             domain=StringUtils.get_url_domain(torrent_url),
+                             save_path=self._save_path or self._mp_path,
+                             category=self._custom_category if self._custom_category else None,
+                             tags=str(self._custom_tags).split(",") if self._custom_tags else [])
+        candidates = self.__candidates()
+
         # 获取种子对应站点cookie
-        domain = StringUtils.get_url_domain(torrent_url)
+        domain = request.domain
         if not domain:
             logger.error(f"种子 {torrent_url} 获取站点域名失败，跳过处理")
-            return None, None
+            return request.finish(TaskStatus.FAILED, "获取站点域名失败")
 
         site = None
         try:
             # 查询站点
-            site = self.site.get_by_domain(domain)
+            site = self._site_index.get(domain)
             if not site or not site.cookie:
                 logger.warning(f"种子 {torrent_url} 获取站点cookie失败，跳过处理")
                 # return None, None
         except Exception as e:
-            logger.error(f"种子 {torrent_url} 获取站点cookie失败，跳过处理 {e}")
-            return None, None
-            
-        tags =  str(self._custom_tags).split(",") if self._custom_tags else []
-        category = self._custom_category if self._custom_category else None
-        service = self.service_info(self._downloader)
-        download_id = self.__download(service=service,
-                                      content=torrent_url,
-                                      save_path=self._save_path or self._mp_path,
-                                      cookie=site.cookie if site else 'site.cookie',
-                                      tags=tags,
-                                      category=category
-                                      )
+            logger.error(f"种子 {torrent_url} 获取站点cookie失败，稍后重试 {e}")
+            return request.finish(TaskStatus.DEFER, f"获取站点cookie失败 {e}")
+
+        request.site_name = site.name if site else domain
+        request.cookie = site.cookie if site else 'site.cookie'
+        size = 0
+        # 预先下载种子文件，下载器直接使用种子内容添加
+        if self._fetcher and not request.infohash:
+            meta, content, reason = self._fetcher.fetch(url=torrent_url,
+                                                        domain=domain,
+                                                        cookie=site.cookie if site else None,
+                                                        ua=site.ua if site else None,
+                                                        proxy=site.proxy if site else False)
+            if reason == ABORTED:
+                return request.finish(TaskStatus.DEFER, reason)
+            if not content:
+                logger.warning(f"种子 {torrent_url} 下载失败：{reason}")
+                return request.finish(TaskStatus.RETRY, f"种子下载失败：{reason}")
+            request.infohash, request.content, size = meta.infohash, content, meta.size
+            if self.__exists(meta.infohash, candidates):
+                logger.info(f"种子 {torrent_url} 已存在于下载器，跳过处理")
+                return request.finish(TaskStatus.SKIPPED, "已存在于下载器")
+
+        # 选择下载器，不可用的下载器按退避时间暂不参与
+        available = [name for name in candidates if not self._queue.backoff_until(f"downloader:{name}")]
+        if len(candidates) > 1:
+            request.downloader = self._router.pick(available, size) if available else None
+        else:
+            request.downloader = available[0] if available else None
+        if not request.downloader:
+            return request.finish(TaskStatus.DEFER, f"下载器 {'、'.join(candidates)} 暂不可用")
 
+        # 下载器不可用时按下载器退避，稍后重试
+        downloader_key = f"downloader:{request.downloader}"
+        if not self.service_info(request.downloader):
+            self._queue.record_failure(downloader_key)
+            return request.finish(TaskStatus.DEFER, f"下载器 {request.downloader} 暂不可用")
+        self._queue.record_success(downloader_key)
+
+        # 剩余空间不足时暂缓或拒绝添加，最终未添加时由 __release_space 释放预留
+        if self._space_guard and size:
+            admitted, free = self._space_guard.admit(request.downloader, request.save_path, size)
+            if not admitted:
+                message = (f"剩余空间不足，种子大小 {StringUtils.str_filesize(size)}，"
+                           f"可用 {StringUtils.str_filesize(free)}")
+                logger.warning(f"种子 {torrent_url} {message}")
+                return request.finish(TaskStatus.DEFER if self._space_policy == "defer"
+                                      else TaskStatus.FAILED, message)
+            request.reserved = size
+        return request
+
+    def __release_space(self, requests: List[AddRequest]):
+        """
+        未添加成功的种子释放预留的剩余空间
+        """
+        if not self._space_guard:
+            return
+        for request in requests:
+            if request.reserved and request.status != TaskStatus.ADDED:
+                self._space_guard.release(request.downloader, request.save_path, request.reserved)
+                request.reserved = 0
+
+    def __candidates(self) -> List[str]:
+        """
+        可选的目标下载器
+        """
+        if self._route_mode == "least_loaded" and self._route_downloaders:
+            return list(self._route_downloaders)
+        return [self._downloader]
+
+    def __exists(self, infohash: Optional[str], downloaders: List[str]) -> bool:
+        """
+        种子是否已存在于任一下载器
+        """
+        return bool(infohash) and any(self._hash_index.contains(name, infohash) for name in downloaders)
+
+    def __probe_load(self, name: str) -> Optional[DownloaderLoad]:
+        """
+        探测下载器负载：活动种子数、剩余空间、传输速度
+        """
+        service = self.service_info(name)
+        if not service:
+            return None
+        downloader = service.instance
+        if self.downloader_helper.is_downloader("qbittorrent", service=service):
+            transfer = downloader.qbc.transfer_info()
+            active = downloader.qbc.torrents_info(status_filter="active")
+            return DownloaderLoad(name=name,
+                                  active=len(active or []),
+                                  free_space=self.__free_space(name, self._save_path or self._mp_path),
+                                  download_speed=transfer.get("dl_info_speed") or 0,
+                                  upload_speed=transfer.get("up_info_speed") or 0,
+                                  updated_at=time.time())
+        if self.downloader_helper.is_downloader("transmission", service=service):
+            stats = downloader.trc.session_stats()
+            return DownloaderLoad(name=name,
+                                  active=stats.active_torrent_count,
+                                  free_space=self.__free_space(name, self._save_path or self._mp_path),
+                                  download_speed=stats.download_speed,
+                                  upload_speed=stats.upload_speed,
+                                  updated_at=time.time())
+        return None
+
+    def refresh_loads(self):
+        """
+        定时探测下载器负载
+        """
+        if self._router and self._route_downloaders:
+            self._router.refresh(list(self._route_downloaders))
+
+    def __free_space(self, downloader: str, save_path: str) -> Optional[int]:
+        """
+        查询保存路径剩余空间，优先使用下载器上报的数据，其次为本地路径
+        """
+        service = self.service_info(downloader)
+        try:
+            if service and self.downloader_helper.is_downloader("transmission", service=service):
+                free = service.instance.trc.free_space(save_path)
+                if free is not None:
+                    return free
+            elif service and self.downloader_helper.is_downloader("qbittorrent", service=service):
+                free = self.__qb_free_space(downloader, service.instance.qbc)
+                if free is not None:
+                    return free
+        except Exception as err:
+            logger.debug(f"查询下载器 {downloader} 剩余空间失败：{err}")
+        if save_path and Path(save_path).exists():
+            return shutil.disk_usage(save_path).free
+        return None
+
+    def __qb_free_space(self, downloader: str, qbc: Any) -> Optional[int]:
+        """
+        qbittorrent 只上报默认保存路径所在磁盘的剩余空间，且只能通过 maindata 获取；
+        保存上次的 rid 增量同步，只返回变化的种子及字段，剩余空间未变化时沿用上次的值
+        """
+        with self._maindata_lock:
+            rid, free = self._maindata.get(downloader, (0, None))
+            maindata = qbc.sync_maindata(rid=rid)
+            if maindata.get("full_update"):
+                free = None
+            free = (maindata.get("server_state") or {}).get("free_space_on_disk", free)
+            self._maindata[downloader] = (maindata.get("rid") or 0, free)
+            return free
+
+    def __add(self, request: AddRequest, acquired: bool = False):
+        """
+        添加单个种子
+        :param acquired: 已取得站点令牌（合并添加失败后逐个添加时）
+        """
+        # 由下载器请求站点时同样需要限流，退出时不再请求站点，稍后重试
+        if not request.content and not acquired and not self._limiter.acquire(request.domain):
+            request.finish(TaskStatus.DEFER, ABORTED)
+            return
+        service = self.service_info(request.downloader)
+        if not service:
+            self.__defer_unavailable([request])
+            return
+        try:
+            download_id = self.__download(service=service,
+                                          content=request.content or request.url,
+                                          save_path=request.save_path,
+                                          cookie=request.cookie,
+                                          tags=request.tags,
+                                          category=request.category
+                                          )
+        except Exception as err:
+            # 请求下载器出错，计入下载器失败，稍后重试
+            logger.error(f"下载器 {request.downloader} 添加种子出错：{err}")
+            self._health.report_failure(request.downloader)
+            request.finish(TaskStatus.DEFER, f"下载器 {request.downloader} 添加种子出错：{err}")
+            return
+        self.__finish_add(request, download_id)
+
+    def __add_batch(self, requests: List[AddRequest]):
+        """
+        qbittorrent 一次请求添加多个链接，失败时逐个添加以确定具体失败的链接
+        """
+        if len(requests) == 1:
+            self.__add(requests[0])
+            return
+        first = requests[0]
+        service = self.service_info(first.downloader)
+        if not service:
+            self.__defer_unavailable(requests)
+            return
+        if first.content:
+            # 多个种子文件一次上传
+            content = [request.content for request in requests]
+        else:
+            if not all(self._limiter.acquire(request.domain) for request in requests):
+                for request in requests:
+                    request.finish(TaskStatus.DEFER, ABORTED)
+                return
+            content = "\n".join(request.url for request in requests)
+        try:
+            added = service.instance.add_torrent(content=content,
+                                                 download_dir=first.save_path,
+                                                 is_paused=self._is_paused,
+                                                 tag=first.tags,
+                                                 category=first.category,
+                                                 cookie=first.cookie)
+        except Exception as err:
+            logger.error(f"下载器 {first.downloader} 合并添加种子出错：{err}")
+            self._health.report_failure(first.downloader)
+            for request in requests:
+                request.finish(TaskStatus.DEFER, f"下载器 {first.downloader} 添加种子出错：{err}")
+            return
+        if not added:
+            logger.warning(f"合并添加 {len(requests)} 个种子失败，改为逐个添加")
+            for request in requests:
+                self.__add(request, acquired=True)
+            return
+        # qbittorrent 部分种子添加失败时同样返回成功，预先下载过的种子按 infohash 逐个确认
+        missing = self.__missing_hashes(service, [request.infohash for request in requests if request.infohash])
+        logger.info(f"合并添加 {len(requests) - len(missing)} 个种子到下载器 {first.downloader}")
+        for request in requests:
+            if request.infohash in missing:
+                logger.error(f"种子添加下载失败 {request.url} 合并添加后未在下载器中找到")
+                request.finish(TaskStatus.RETRY, "种子添加下载失败，合并添加后未在下载器中找到")
+            else:
+                self.__finish_add(request, True)
+
+    @staticmethod
+    def __missing_hashes(service: ServiceInfo, hashes: List[str]) -> Set[str]:
+        """
+        合并添加后不在下载器中的种子，qbittorrent 异步添加，未找到时稍等再确认一次
+        """
+        missing = set(hashes)
+        for delay in (0, 1):
+            if not missing:
+                break
+            time.sleep(delay)
+            try:
+                torrents = service.instance.qbc.torrents_info(torrent_hashes="|".join(missing))
+            except Exception as err:
+                logger.warning(f"确认合并添加结果失败：{err}")
+                return set()
+            missing -= {torrent.get("hash") for torrent in torrents}
+        return missing
+
+    def __defer_unavailable(self, requests: List[AddRequest]):
+        """
+        准备之后下载器变为不可用（熔断），按下载器退避，不计入站点失败
+        """
+        downloader = requests[0].downloader
+        self._queue.record_failure(f"downloader:{downloader}")
+        for request in requests:
+            request.finish(TaskStatus.DEFER, f"下载器 {downloader} 暂不可用")
+
+    def __finish_add(self, request: AddRequest, download_id: Any):
+        """
+        记录添加结果
+        """
         if download_id:
-            logger.info(f"种子添加下载成功 {torrent_url} 保存位置 {self._save_path or self._mp_path}")
-            return 'site.name', f"种子添加下载成功, 保存位置 {self._save_path or self._mp_path}"
+            self._hash_index.add(request.downloader,
+                                 download_id if isinstance(download_id, str) else request.infohash)
+            logger.info(f"种子添加下载成功 {request.url} 保存位置 {request.save_path}")
+            request.finish(TaskStatus.ADDED, f"种子添加下载成功, 保存位置 {request.save_path}")
         else:
-            logger.error(f"种子添加下载失败 {torrent_url} 保存位置 {self._save_path or self._mp_path}")
-            return 'site.name', f"种子添加下载失败, 保存位置 {self._save_path or self._mp_path}"
+            logger.error(f"种子添加下载失败 {request.url} 保存位置 {request.save_path}")
+            request.finish(TaskStatus.RETRY, f"种子添加下载失败, 保存位置 {request.save_path}")
+
+    @eventmanager.register(EventType.SiteUpdated)
+    @eventmanager.register(EventType.SiteDeleted)
+    def site_changed(self, event: Event = None):
+        """
+        站点变更时重建站点索引及站点限流
+        """
+        if self._site_index:
+            self._site_index.invalidate()
+        if self._limiter:
+            self._limiter.reset()
+
+    @eventmanager.register(EventType.DownloadAdded)
+    def download_added(self, event: Event = None):
+        """
+        其它途径添加的种子同步到种子索引
+        """
+        if not event or not event.event_data or not self._hash_index:
+            return
+        self._hash_index.add(event.event_data.get("downloader"), event.event_data.get("hash"))
+
+    @eventmanager.register(EventType.DownloadDeleted)
+    def download_deleted(self, event: Event = None):
+        """
+        删除的种子从种子索引中移除
+        """
+        if not event or not event.event_data or not self._hash_index:
+            return
+        self._hash_index.discard(event.event_data.get("hash"))
+
+    def __load_torrent_hashes(self, name: str) -> Optional[Set[str]]:
+        """
+        一次性拉取下载器全部种子的 infohash
+        """
+        # 经连接状态缓存判断，熔断中的下载器与其它路径一样直接跳过
+        service = self.service_info(name)
+        if not service:
+            return None
+        torrents, error = service.instance.get_torrents()
+        if error:
+            logger.warning(f"获取下载器 {name} 种子列表失败")
+            return None
+        if self.downloader_helper.is_downloader("qbittorrent", service=service):
+            return {str(torrent.get("hash")).lower() for torrent in torrents or []}
+        return {str(torrent.hashString).lower() for torrent in torrents or []}
 
     @eventmanager.register(EventType.PluginAction)
     def remote_sync_one(self, event: Event = None):
@@ -122,8 +619,12 @@ class DownloadTorrentPlus(_PluginBase):
                 logger.error(f"缺少参数：{event_data}")
                 return
 
-            site_name, result = self.__download_torrent(args)
-            if not result:
+            status, site_name, result = self.__download_torrent(args)
+            if status == TaskStatus.SKIPPED:
+                self.post_message(channel=event.event_data.get("channel"),
+                                  title=f"种子{result}，跳过添加",
+                                  userid=event.event_data.get("user"))
+            elif not site_name:
                 self.post_message(channel=event.event_data.get("channel"),
                                   title="添加种子下载失败",
                                   userid=event.event_data.get("user"))
@@ -140,17 +641,38 @@ class DownloadTorrentPlus(_PluginBase):
             logger.warning("尚未配置下载器，请检查配置")
             return None
 
+        # 使用缓存的连接状态，不可用或熔断中直接返回
+        if not self._health.is_up(name):
+            logger.debug(f"下载器 {name} 当前不可用")
+            return None
+
         service = self.downloader_helper.get_service(name)
         if not service or not service.instance:
             logger.warning(f"获取下载器 {name} 实例失败，请检查配置")
             return None
+        return service
 
+    def __check_downloader(self, name: str) -> bool:
+        """
+        检查下载器连接
+        """
+        service = self.downloader_helper.get_service(name)
+        if not service or not service.instance:
+            logger.warning(f"获取下载器 {name} 实例失败，请检查配置")
+            return False
         if service.instance.is_inactive():
             logger.warning(f"下载器 {name} 未连接，请检查配置")
-            return None
-        return service
+            return False
+        return True
 
-    def __download(self, service: ServiceInfo, content: str,
+    def refresh_health(self):
+        """
+        定时检查下载器连接
+        """
+        if self._health:
+            self._health.refresh([name for name in self.__candidates() if name])
+
+    def __download(self, service: ServiceInfo, content: Union[str, bytes],
                    save_path: str, cookie: str, category: str, tags: List[str]) -> Optional[str]:
         """
         添加下载任务
@@ -203,8 +725,39 @@ class DownloadTorrentPlus(_PluginBase):
             }
         ]
 
+    def get_service(self) -> List[Dict[str, Any]]:
+        """
+        注册插件公共服务
+        """
+        if not self._enabled:
+            return []
+        services = [{
+            "id": "DownloadTorrentPlusHealthProbe",
+            "name": "下载器连接检查",
+            "trigger": "interval",
+            "func": self.refresh_health,
+            "kwargs": {"seconds": 30}
+        }]
+        if self._route_mode == "least_loaded" and self._router:
+            services.append({
+                "id": "DownloadTorrentPlusLoadProbe",
+                "name": "下载器负载探测",
+                "trigger": "interval",
+                "func": self.refresh_loads,
+                "kwargs": {"seconds": 60}
+            })
+        return services
+
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [
+            {
+                "path": "/job",
+                "endpoint": self.get_job,
+                "methods": ["GET"],
+                "summary": "批量添加任务状态",
+                "description": "查询批量添加种子任务的成功、失败、跳过汇总",
+            }
+        ]
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         """
@@ -314,6 +867,246 @@ class DownloadTorrentPlus(_PluginBase):
                             },
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'max_workers',
+                                            'label': '全局并发数',
+                                            'type': 'number',
+                                            'hint': '批量添加时同时处理的种子链接数'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'site_workers',
+                                            'label': '单站点并发数',
+                                            'type': 'number',
+                                            'hint': '批量添加时同一站点同时处理的种子链接数'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'batch_add',
+                                            'label': '合并添加',
+                                            'hint': 'qbittorrent 将同一站点的多个链接合并为一次请求添加'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'batch_size',
+                                            'label': '每次合并链接数',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'rate_limit',
+                                            'label': '单站点每秒请求数',
+                                            'type': 'number',
+                                            'hint': '站点管理中设置了流控时以站点设置为准，0为不限制未设置流控的站点'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'rate_burst',
+                                            'label': '单站点突发请求数',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'prefetch',
+                                            'label': '预先下载种子',
+                                            'hint': '由插件复用站点连接下载种子文件后再交给下载器'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'prefetch_cache_mb',
+                                            'label': '种子缓存大小(MB)',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'space_check',
+                                            'label': '检查剩余空间',
+                                            'hint': '需开启预先下载种子，否则不生效',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'min_free_gb',
+                                            'label': '保留空间(GB)',
+                                            'type': 'number'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSelect',
+                                        'props': {
+                                            'model': 'space_policy',
+                                            'label': '空间不足时',
+                                            'items': [
+                                                {'title': '稍后重试', 'value': 'defer'},
+                                                {'title': '放弃添加', 'value': 'reject'}
+                                            ]
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSelect',
+                                        'props': {
+                                            'model': 'route_mode',
+                                            'label': '下载器选择',
+                                            'items': [
+                                                {'title': '固定下载器', 'value': 'fixed'},
+                                                {'title': '负载最低', 'value': 'least_loaded'}
+                                            ]
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 8
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSelect',
+                                        'props': {
+                                            'multiple': True,
+                                            'chips': True,
+                                            'clearable': True,
+                                            'model': 'route_downloaders',
+                                            'label': '负载均衡下载器',
+                                            'items': downloader_options,
+                                            'hint': '按活动种子数、剩余空间、传输速度选择负载最低的下载器'
+                                        }
+                                    }
+                                ]
+                            },
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -410,6 +1203,8 @@ class DownloadTorrentPlus(_PluginBase):
                                             'variant': 'tonal',
                                             'text': '保存路径为下载器保存路径，种子链接一行一个。'
                                                     '添加的种子链接需站点已在站点管理维护或公共站点。'
+                                                    '保存后种子链接在后台批量添加，失败的链接自动重试，'
+                                                    '重启后继续未完成的任务，全部完成后发送汇总通知。'
                                         }
                                     }
                                 ]
@@ -424,7 +1219,20 @@ class DownloadTorrentPlus(_PluginBase):
             "enabled": False,
             "save_path": "",
             "mp_path": "",
-            "torrent_urls": ""
+            "torrent_urls": "",
+            "max_workers": 4,
+            "site_workers": 2,
+            "batch_add": False,
+            "batch_size": 20,
+            "prefetch": False,
+            "prefetch_cache_mb": 64,
+            "space_check": False,
+            "min_free_gb": 10,
+            "space_policy": "defer",
+            "route_mode": "fixed",
+            "route_downloaders": [],
+            "rate_limit": 1,
+            "rate_burst": 5
         }
 
     def get_page(self) -> List[dict]:
@@ -434,4 +1242,14 @@ class DownloadTorrentPlus(_PluginBase):
         """
         退出插件
         """
-        pass
\ No newline at end of file
+        if self._event:
+            self._event.set()
+        if self._pipeline:
+            self._pipeline.shutdown()
+            self._pipeline = None
+        if self._queue:
+            self._queue.close()
+            self._queue = None
+        if self._fetcher:
+            self._fetcher.close()
+            self._fetcher = None
\ No newline at end of file
@@ -0,0 +1,59 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class SpaceGuard:
+    """
+    按下载器保存路径估算剩余空间，添加种子前预留空间，避免批量添加超出磁盘容量
+    剩余空间按有效期缓存，刷新后清零已预留的空间
+    """
+
+    def __init__(self, probe: Callable[[str, str], Optional[int]], min_free: int = 0, ttl: int = 60):
+        """
+        :param probe: 按 (下载器, 保存路径) 查询剩余空间（字节），未知返回 None
+        :param min_free: 需保留的最小剩余空间（字节）
+        :param ttl: 剩余空间缓存有效期（秒）
+        """
+        self._probe = probe
+        self._min_free = min_free
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # (下载器, 保存路径) -> [剩余空间, 查询时间, 已预留]
+        self._state: Dict[Tuple[str, str], list] = {}
+
+    def admit(self, downloader: str, save_path: str, size: int) -> Tuple[bool, Optional[int]]:
+        """
+        检查并预留空间
+        :return: 是否允许添加、当前可用空间（未知为 None）
+        """
+        key = (downloader, save_path or "")
+        with self._lock:
+            state = self._state.get(key)
+            stale = not state or time.time() - state[1] > self._ttl
+        if stale:
+            # 查询下载器不持有锁，避免阻塞其它工作线程
+            free = self._probe(downloader, save_path)
+            with self._lock:
+                state = self._state.get(key)
+                if not state or time.time() - state[1] > self._ttl:
+                    self._state[key] = [free, time.time(), 0]
+        with self._lock:
+            state = self._state[key]
+            free, _, reserved = state
+            if free is None:
+                return True, None
+            available = free - reserved - self._min_free
+            if size > available:
+                return False, max(0, available)
+            state[2] += size
+            return True, available - size
+
+    def release(self, downloader: str, save_path: str, size: int):
+        """
+        种子最终未添加时释放预留的空间
+        """
+        with self._lock:
+            state = self._state.get((downloader, save_path or ""))
+            if state:
+                state[2] = max(0, state[2] - size)
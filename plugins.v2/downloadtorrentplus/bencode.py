@@ -0,0 +1,157 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+
+class BencodeError(ValueError):
+    """
+    种子文件格式错误
+    """
+    pass
+
+
+@dataclass
+class TorrentMeta:
+    """
+    种子文件摘要
+    """
+    infohash: str
+    size: int
+    name: Optional[str] = None
+
+
+class _Scanner:
+    """
+    在原始缓冲区上按偏移量扫描 bencode，只解析需要的字段，
+    字符串（包括 pieces）只记录起止位置而不复制
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.buf = memoryview(data)
+        self.size = len(data)
+
+    def byte(self, i: int) -> int:
+        if i >= self.size:
+            raise BencodeError("种子文件不完整")
+        return self.buf[i]
+
+    def int_at(self, i: int) -> Tuple[int, int]:
+        """
+        解析整数 i<n>e，返回 (值, 结束位置)
+        """
+        end = self.find(ord("e"), i + 1)
+        try:
+            return int(bytes(self.buf[i + 1:end])), end + 1
+        except ValueError:
+            raise BencodeError(f"整数格式错误，位置 {i}")
+
+    def str_at(self, i: int) -> Tuple[int, int]:
+        """
+        解析字符串 <len>:<data>，返回 (数据起始位置, 结束位置)
+        """
+        colon = self.find(ord(":"), i)
+        try:
+            length = int(bytes(self.buf[i:colon]))
+        except ValueError:
+            raise BencodeError(f"字符串长度错误，位置 {i}")
+        start = colon + 1
+        if start + length > self.size:
+            raise BencodeError("种子文件不完整")
+        return start, start + length
+
+    def find(self, char: int, i: int) -> int:
+        pos = self.data.find(bytes((char,)), i)
+        if pos < 0:
+            raise BencodeError("种子文件不完整")
+        return pos
+
+    def skip(self, i: int) -> int:
+        """
+        跳过任意值，返回结束位置
+        """
+        char = self.byte(i)
+        if char == ord("i"):
+            return self.int_at(i)[1]
+        if char in (ord("l"), ord("d")):
+            i += 1
+            while self.byte(i) != ord("e"):
+                i = self.skip(i)
+            return i + 1
+        if ord("0") <= char <= ord("9"):
+            return self.str_at(i)[1]
+        raise BencodeError(f"未知类型 {chr(char)}，位置 {i}")
+
+    def walk_dict(self, i: int, handler: Callable[[bytes, int], Optional[int]]) -> int:
+        """
+        遍历字典，handler(键, 值起始位置) 返回值结束位置，返回 None 时跳过该值
+        :return: 字典结束位置
+        """
+        if self.byte(i) != ord("d"):
+            raise BencodeError(f"应为字典，位置 {i}")
+        i += 1
+        while self.byte(i) != ord("e"):
+            key_start, key_end = self.str_at(i)
+            end = handler(bytes(self.buf[key_start:key_end]), key_end)
+            i = end if end is not None else self.skip(key_end)
+        return i + 1
+
+
+def _files_size(scanner: _Scanner, i: int) -> Tuple[int, int]:
+    """
+    多文件种子 files 列表的总大小
+    """
+    if scanner.byte(i) != ord("l"):
+        raise BencodeError(f"files 应为列表，位置 {i}")
+    total = 0
+    i += 1
+    while scanner.byte(i) != ord("e"):
+        def on_file(key: bytes, pos: int) -> Optional[int]:
+            nonlocal total
+            if key == b"length" and scanner.byte(pos) == ord("i"):
+                value, end = scanner.int_at(pos)
+                total += value
+                return end
+            return None
+        i = scanner.walk_dict(i, on_file)
+    return total, i + 1
+
+
+def scan_torrent(data: bytes) -> TorrentMeta:
+    """
+    从种子文件中提取 infohash（v1）、总大小及名称，info 字典直接在原始缓冲区上计算哈希
+    """
+    scanner = _Scanner(data)
+    info_span = None
+    size = 0
+    name = None
+
+    def on_info(key: bytes, pos: int) -> Optional[int]:
+        nonlocal size, name
+        if key == b"length" and scanner.byte(pos) == ord("i"):
+            value, end = scanner.int_at(pos)
+            size += value
+            return end
+        if key == b"files":
+            value, end = _files_size(scanner, pos)
+            size += value
+            return end
+        if key == b"name" and scanner.byte(pos) != ord("d"):
+            start, end = scanner.str_at(pos)
+            name = bytes(scanner.buf[start:end]).decode("utf-8", errors="replace")
+            return end
+        return None
+
+    def on_root(key: bytes, pos: int) -> Optional[int]:
+        nonlocal info_span
+        if key == b"info":
+            end = scanner.walk_dict(pos, on_info)
+            info_span = (pos, end)
+            return end
+        return None
+
+    scanner.walk_dict(0, on_root)
+    if not info_span:
+        raise BencodeError("缺少 info 字典")
+    infohash = hashlib.sha1(scanner.buf[info_span[0]:info_span[1]]).hexdigest()
+    return TorrentMeta(infohash=infohash, size=size, name=name)
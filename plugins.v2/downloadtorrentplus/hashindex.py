@@ -0,0 +1,74 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Set
+
+from app.log import logger
+
+
+class HashIndex:
+    """
+    下载器 -> 已有种子 infohash 集合
+    每个下载器首次查询时全量拉取一次种子列表，之后由添加成功、下载事件增量维护，
+    超过有效期后重新全量拉取以纠正在下载器中直接删除的种子
+    """
+
+    def __init__(self, loader: Callable[[str], Optional[Set[str]]], ttl: int = 1800):
+        """
+        :param loader: 按下载器名称返回全部种子 infohash，失败返回 None
+        :param ttl: 全量列表有效期（秒）
+        """
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._hashes: Dict[str, Set[str]] = {}
+        self._built_at: Dict[str, float] = {}
+
+    def __ensure(self, downloader: str) -> Optional[Set[str]]:
+        with self._lock:
+            if time.time() - self._built_at.get(downloader, 0) <= self._ttl:
+                return self._hashes.get(downloader)
+            build_lock = self._build_locks.setdefault(downloader, threading.Lock())
+        # 同一下载器只拉取一次，其它线程等待结果
+        with build_lock:
+            with self._lock:
+                if time.time() - self._built_at.get(downloader, 0) <= self._ttl:
+                    return self._hashes.get(downloader)
+            hashes = self._loader(downloader)
+            if hashes is None:
+                return None
+            with self._lock:
+                self._hashes[downloader] = hashes
+                self._built_at[downloader] = time.time()
+            logger.debug(f"下载器 {downloader} 种子索引已重建，共 {len(hashes)} 个种子")
+            return hashes
+
+    def contains(self, downloader: str, infohash: str) -> bool:
+        """
+        下载器中是否已存在该种子，获取种子列表失败时视为不存在
+        """
+        if not downloader or not infohash:
+            return False
+        hashes = self.__ensure(downloader)
+        return bool(hashes) and infohash.lower() in hashes
+
+    def add(self, downloader: str, infohash: str):
+        """
+        记录新添加的种子
+        """
+        if not downloader or not infohash:
+            return
+        with self._lock:
+            if downloader in self._hashes:
+                self._hashes[downloader].add(infohash.lower())
+
+    def discard(self, infohash: str):
+        """
+        从所有下载器中移除种子
+        """
+        if not infohash:
+            return
+        with self._lock:
+            for hashes in self._hashes.values():
+                hashes.discard(infohash.lower())
+
@@ -0,0 +1,109 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from app.log import logger
+
+
+@dataclass
+class HealthState:
+    """
+    下载器连接状态
+    """
+    up: bool = False
+    checked_at: float = 0.0
+    # 连续失败次数
+    failures: int = 0
+    # 熔断截止时间
+    open_until: float = 0.0
+
+
+class DownloaderHealth:
+    """
+    下载器连接状态缓存，带熔断
+    状态在有效期内直接使用缓存结果；连续失败达到阈值后熔断，熔断期间直接判定为不可用，
+    到期后放行一次检查（半开），成功则恢复，失败则加倍熔断时间
+    """
+
+    def __init__(self, checker: Callable[[str], bool], ttl: int = 30,
+                 failure_threshold: int = 3, cooldown: int = 60, max_cooldown: int = 900):
+        """
+        :param checker: 实际检查下载器是否在线
+        :param ttl: 状态有效期（秒）
+        :param failure_threshold: 连续失败多少次后熔断
+        :param cooldown: 首次熔断时间（秒）
+        :param max_cooldown: 最长熔断时间（秒）
+        """
+        self._checker = checker
+        self._ttl = ttl
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._check_locks: Dict[str, threading.Lock] = {}
+        self._states: Dict[str, HealthState] = {}
+
+    def is_up(self, name: str) -> bool:
+        """
+        下载器是否可用
+        """
+        with self._lock:
+            state = self._states.setdefault(name, HealthState())
+            now = time.time()
+            if state.open_until > now:
+                return False
+            if now - state.checked_at <= self._ttl:
+                return state.up
+            check_lock = self._check_locks.setdefault(name, threading.Lock())
+        # 同一下载器同时只检查一次，其它线程使用检查结果
+        with check_lock:
+            with self._lock:
+                if time.time() - state.checked_at <= self._ttl:
+                    return state.up
+            return self.check(name)
+
+    def check(self, name: str) -> bool:
+        """
+        立即检查下载器并更新状态
+        """
+        try:
+            up = bool(self._checker(name))
+        except Exception as err:
+            logger.warning(f"检查下载器 {name} 连接失败：{err}")
+            up = False
+        if up:
+            self.report_success(name)
+        else:
+            self.report_failure(name)
+        return up
+
+    def refresh(self, names: List[str]):
+        """
+        后台定时检查
+        """
+        for name in names:
+            with self._lock:
+                state = self._states.setdefault(name, HealthState())
+                # 熔断中的下载器等到期后再检查
+                if state.open_until > time.time():
+                    continue
+            self.check(name)
+
+    def report_success(self, name: str):
+        with self._lock:
+            state = self._states.setdefault(name, HealthState())
+            if not state.up and state.checked_at:
+                logger.info(f"下载器 {name} 已恢复连接")
+            state.up, state.checked_at, state.failures, state.open_until = True, time.time(), 0, 0
+
+    def report_failure(self, name: str):
+        with self._lock:
+            state = self._states.setdefault(name, HealthState())
+            state.up, state.checked_at = False, time.time()
+            state.failures += 1
+            if state.failures >= self._failure_threshold:
+                cooldown = min(self._max_cooldown,
+                               self._cooldown * 2 ** (state.failures - self._failure_threshold))
+                state.open_until = time.time() + cooldown
+                logger.warning(f"下载器 {name} 连续 {state.failures} 次不可用，{int(cooldown)} 秒内不再尝试")
@@ -0,0 +1,241 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class TaskState:
+    """
+    队列中任务的状态
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    ADDED = "added"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+
+
+class JobQueue:
+    """
+    基于 SQLite 的持久化添加任务队列
+    记录每个种子链接的状态、重试次数及下次执行时间，并按站点、下载器记录指数退避，
+    插件重启后未完成的任务继续执行
+    """
+
+    def __init__(self, path: Path, base_delay: int = 30, max_delay: int = 3600):
+        """
+        :param path: 数据库文件路径
+        :param base_delay: 首次退避时间（秒）
+        :param max_delay: 最大退避时间（秒）
+        """
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                site TEXT,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_at REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_state_next ON tasks (state, next_at);
+            CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks (job_id, state);
+            CREATE TABLE IF NOT EXISTS backoff (
+                key TEXT PRIMARY KEY,
+                failures INTEGER NOT NULL,
+                until REAL NOT NULL
+            );
+        """)
+        # 旧版本的任务表没有站点字段
+        if "site" not in {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN site TEXT")
+
+    @contextmanager
+    def __transaction(self, begin: str = "BEGIN"):
+        """
+        入队、领取任务的事务，出错时回滚，否则之后的 BEGIN 都会失败，队列直到重启前无法再入队或领取
+        """
+        self._conn.execute(begin)
+        try:
+            yield
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, job_id: str, items: List[Tuple[str, str, str, str]]):
+        """
+        添加任务
+        :param items: (链接, 站点, 状态, 说明)，入队前已判定结果的链接直接记录为终态
+        """
+        now = time.time()
+        with self._lock:
+            with self.__transaction():
+                self._conn.executemany(
+                    "INSERT INTO tasks (job_id, url, site, state, message, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(job_id, url, site, state, message, now, now) for url, site, state, message in items])
+
+    def recover(self) -> int:
+        """
+        插件重启后，将上次未执行完的任务恢复为待执行
+        """
+        with self._lock:
+            cursor = self._conn.execute("UPDATE tasks SET state = ? WHERE state = ?",
+                                        (TaskState.PENDING, TaskState.RUNNING))
+            return cursor.rowcount
+
+    def claim_due(self, limit: int, per_site: Optional[int] = None,
+                  exclude: Iterable[str] = ()) -> List[Tuple[int, str, str, int]]:
+        """
+        取出已到执行时间的任务并标记为执行中
+        :param per_site: 每个站点最多取出的任务数，避免一个站点的积压占满缓冲
+        :param exclude: 不取出这些站点的任务
+        :return: (任务ID, 批量任务ID, 链接, 已尝试次数)
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        exclude = list(exclude)
+        sql = ("SELECT id, job_id, url, attempts, next_at, "
+               "ROW_NUMBER() OVER (PARTITION BY site ORDER BY next_at, id) AS n "
+               "FROM tasks WHERE state = ? AND next_at <= ?")
+        params: list = [TaskState.PENDING, now]
+        if exclude:
+            sql += f" AND IFNULL(site, '') NOT IN ({','.join('?' * len(exclude))})"
+            params += exclude
+        params += [per_site or limit, limit]
+        with self._lock:
+            with self.__transaction("BEGIN IMMEDIATE"):
+                rows = self._conn.execute(
+                    f"SELECT id, job_id, url, attempts FROM ({sql}) WHERE n <= ? "
+                    "ORDER BY next_at, id LIMIT ?", params).fetchall()
+                self._conn.executemany("UPDATE tasks SET state = ?, updated_at = ? WHERE id = ?",
+                                       [(TaskState.RUNNING, now, row[0]) for row in rows])
+        return rows
+
+    def release(self, task_ids: List[int], next_at: float):
+        """
+        未执行的任务放回队列，延后到指定时间
+        """
+        with self._lock:
+            self._conn.executemany("UPDATE tasks SET state = ?, next_at = ?, updated_at = ? WHERE id = ?",
+                                   [(TaskState.PENDING, next_at, time.time(), task_id) for task_id in task_ids])
+
+    def finish(self, task_id: int, state: str, message: str = None):
+        """
+        任务结束
+        """
+        with self._lock:
+            self._conn.execute("UPDATE tasks SET state = ?, message = ?, updated_at = ? WHERE id = ?",
+                               (state, message, time.time(), task_id))
+
+    def retry(self, task_id: int, attempts: int, next_at: float, message: str = None):
+        """
+        任务失败，等待重试
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET state = ?, attempts = ?, next_at = ?, message = ?, updated_at = ? WHERE id = ?",
+                (TaskState.PENDING, attempts, next_at, message, time.time(), task_id))
+
+    def delay(self, attempts: int) -> float:
+        """
+        第 attempts 次失败后的退避时间
+        """
+        return min(self._max_delay, self._base_delay * (2 ** max(0, attempts - 1)))
+
+    def record_failure(self, key: str) -> float:
+        """
+        记录站点或下载器失败，返回退避截止时间
+        """
+        with self._lock:
+            now = time.time()
+            row = self._conn.execute("SELECT failures, until FROM backoff WHERE key = ?", (key,)).fetchone()
+            # 退避期间并发任务的失败不重复累计
+            if row and row[1] > now:
+                return row[1]
+            failures = (row[0] if row else 0) + 1
+            until = now + self.delay(failures)
+            self._conn.execute("INSERT OR REPLACE INTO backoff (key, failures, until) VALUES (?, ?, ?)",
+                               (key, failures, until))
+            return until
+
+    def record_success(self, key: str):
+        """
+        站点或下载器恢复，清除退避
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM backoff WHERE key = ?", (key,))
+
+    def backoff_until(self, key: str) -> float:
+        """
+        站点或下载器退避截止时间，未退避返回 0
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT until FROM backoff WHERE key = ?", (key,)).fetchone()
+        return row[0] if row and row[0] > time.time() else 0
+
+    def job_summary(self, job_id: str) -> Dict:
+        """
+        批量任务汇总
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY state",
+                                             (job_id,)).fetchall())
+            created_at, updated_at = self._conn.execute(
+                "SELECT MIN(created_at), MAX(updated_at) FROM tasks WHERE job_id = ?", (job_id,)).fetchone()
+            problems = self._conn.execute(
+                "SELECT url, state, message FROM tasks WHERE job_id = ? AND state IN (?, ?) ORDER BY id",
+                (job_id, TaskState.FAILED, TaskState.SKIPPED)).fetchall()
+        if not counts:
+            return {}
+        pending = counts.get(TaskState.PENDING, 0) + counts.get(TaskState.RUNNING, 0)
+        return {
+            "job_id": job_id,
+            "total": sum(counts.values()),
+            "added": counts.get(TaskState.ADDED, 0),
+            "failed": counts.get(TaskState.FAILED, 0),
+            "skipped": counts.get(TaskState.SKIPPED, 0),
+            "pending": pending,
+            "done": pending == 0,
+            "created_at": created_at,
+            "finished_at": updated_at if pending == 0 else None,
+            "failed_items": [{"url": url, "reason": message} for url, state, message in problems
+                             if state == TaskState.FAILED],
+            "skipped_items": [{"url": url, "reason": message} for url, state, message in problems
+                              if state == TaskState.SKIPPED],
+        }
+
+    def recent_jobs(self, limit: int = 20) -> List[str]:
+        """
+        最近的批量任务ID
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT job_id FROM tasks GROUP BY job_id ORDER BY MAX(id) DESC LIMIT ?",
+                                      (limit,)).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self, before: float):
+        """
+        清理已完成的历史任务
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE state IN (?, ?, ?) AND updated_at < ?",
+                               (TaskState.ADDED, TaskState.SKIPPED, TaskState.FAILED, before))
+            self._conn.execute("DELETE FROM backoff WHERE until < ?", (time.time(),))
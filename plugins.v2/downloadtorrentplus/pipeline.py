@@ -0,0 +1,286 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.log import logger
+
+from .jobqueue import JobQueue, TaskState
+
+
+class TaskStatus:
+    """
+    单个种子链接的处理结果
+    """
+    ADDED = "added"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    # 站点原因导致的临时失败，按站点退避后重试
+    RETRY = "retry"
+    # 非站点原因（下载器离线等）暂缓，稍后重试
+    DEFER = "defer"
+
+
+# 队列中的任务：(任务ID, 批量任务ID, 链接, 已尝试次数)
+Task = Tuple[int, str, str, int]
+
+
+@dataclass
+class AddRequest:
+    """
+    待添加的种子，status 不为空时表示已得出处理结果
+    """
+    url: str
+    domain: Optional[str] = None
+    site_name: Optional[str] = None
+    cookie: Optional[str] = None
+    infohash: Optional[str] = None
+    downloader: Optional[str] = None
+    save_path: Optional[str] = None
+    category: Optional[str] = None
+    tags: List[str] = field(default_factory=list)
+    # 预先下载的种子内容
+    content: Optional[bytes] = None
+    # 已预留的剩余空间（字节）
+    reserved: int = 0
+    status: Optional[str] = None
+    message: str = ""
+
+    def finish(self, status: str, message: str) -> "AddRequest":
+        self.status = status
+        self.message = message
+        return self
+
+    @property
+    def group_key(self) -> tuple:
+        """
+        可合并为一次添加请求的分组
+        """
+        return (self.downloader, self.save_path, self.category, tuple(self.tags),
+                None if self.content else self.cookie, bool(self.content))
+
+
+class BatchPipeline:
+    """
+    批量添加种子流水线
+    任务持久化在 JobQueue 中，全局并发数限制同时处理的链接数，单站点并发数限制同一站点同时处理的链接数，
+    按站点轮询调度，某个站点的积压或退避不会占满全部工作线程
+    """
+    # 内存中最多缓存的待处理任务数
+    buffer_size = 200
+
+    def __init__(self, queue: JobQueue, handler: Callable[[List[str]], List[Tuple[str, str]]],
+                 key_func: Callable[[str], str], max_workers: int = 4, site_workers: int = 2,
+                 batch_size: int = 1, max_attempts: int = 5, poll_interval: int = 15,
+                 on_finish: Optional[Callable[[dict], None]] = None):
+        """
+        :param queue: 持久化任务队列
+        :param handler: 处理同一站点的一组链接，按顺序返回每个链接的 (TaskStatus, 说明)
+        :param key_func: 计算链接所属站点，用于单站点并发限制及退避
+        :param max_workers: 全局并发数
+        :param site_workers: 单站点并发数
+        :param batch_size: 每次交给 handler 的同站点链接数
+        :param max_attempts: 最大尝试次数
+        :param poll_interval: 检查到期重试任务的间隔（秒）
+        :param on_finish: 批量任务完成回调，参数为任务汇总
+        """
+        self._queue = queue
+        self._handler = handler
+        self._key_func = key_func
+        self._max_workers = max(1, max_workers)
+        self._site_workers = max(1, site_workers)
+        self._batch_size = max(1, batch_size)
+        self._max_attempts = max(1, max_attempts)
+        self._poll_interval = poll_interval
+        self._on_finish = on_finish
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                            thread_name_prefix="DownloadTorrentPlus")
+        self._lock = threading.Lock()
+        # 站点 -> 待处理任务
+        self._pending: "OrderedDict[str, Deque[Task]]" = OrderedDict()
+        self._buffered = 0
+        # 站点 -> 处理中数量
+        self._site_inflight: Dict[str, int] = {}
+        self._inflight = 0
+        self._finished_jobs = set()
+        self._stop_event = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        恢复上次未完成的任务并开始调度
+        """
+        recovered = self._queue.recover()
+        if recovered:
+            logger.info(f"恢复 {recovered} 个未完成的种子添加任务")
+        self._poller = threading.Thread(target=self.__poll, name="DownloadTorrentPlus-queue", daemon=True)
+        self._poller.start()
+        self.tick()
+
+    def submit(self, urls: List[str]) -> Tuple[str, int]:
+        """
+        提交一批链接，立即返回批量任务ID及链接数
+        """
+        urls = [url.strip() for url in urls if url and url.strip()]
+        job_id = uuid.uuid4().hex[:8]
+        seen = set()
+        items = []
+        for url in urls:
+            if url in seen:
+                items.append((url, None, TaskState.SKIPPED, "重复链接"))
+                continue
+            seen.add(url)
+            items.append((url, self.__key(url), TaskState.PENDING, None))
+        self._queue.enqueue(job_id, items)
+        self.__check_job(job_id)
+        self.tick()
+        return job_id, len(items)
+
+    def tick(self):
+        """
+        从队列中取出到期任务并调度
+        """
+        if self._stop_event.is_set():
+            return
+        # 每个站点在缓冲中最多保留的任务数，已达上限的站点本次不取，其它站点的任务才能进入缓冲
+        per_site = self._site_workers * self._batch_size * 2
+        with self._lock:
+            capacity = self.buffer_size - self._buffered
+            full = [key for key, queue in self._pending.items() if len(queue) >= per_site]
+        tasks = self._queue.claim_due(capacity, per_site=per_site, exclude=full)
+        deferred: Dict[float, List[int]] = {}
+        accepted = []
+        for task in tasks:
+            key = self.__key(task[2])
+            # 站点退避中，放回队列
+            until = self._queue.backoff_until(f"site:{key}") if key else 0
+            if until:
+                deferred.setdefault(until, []).append(task[0])
+            else:
+                accepted.append((key, task))
+        for until, task_ids in deferred.items():
+            self._queue.release(task_ids, until)
+        with self._lock:
+            for key, task in accepted:
+                self._pending.setdefault(key, deque()).append(task)
+                self._buffered += 1
+        self.__pump()
+
+    def __key(self, url: str) -> str:
+        try:
+            return self._key_func(url) or ""
+        except Exception as err:
+            logger.debug(f"计算链接站点失败 {url}：{err}")
+            return ""
+
+    def __poll(self):
+        while not self._stop_event.wait(self._poll_interval):
+            try:
+                self.tick()
+            except Exception as err:
+                logger.error(f"调度种子添加任务出错：{err}")
+
+    def __pump(self):
+        """
+        在并发限制内调度待处理链接
+        """
+        with self._lock:
+            while not self._stop_event.is_set() and self._inflight < self._max_workers and self._pending:
+                picked = None
+                # 按站点轮询，跳过已达单站点并发上限的站点
+                for key in list(self._pending.keys()):
+                    if self._site_inflight.get(key, 0) >= self._site_workers:
+                        continue
+                    queue = self._pending[key]
+                    picked = (key, [queue.popleft() for _ in range(min(self._batch_size, len(queue)))])
+                    if queue:
+                        self._pending.move_to_end(key)
+                    else:
+                        del self._pending[key]
+                    break
+                if not picked:
+                    break
+                key, tasks = picked
+                self._buffered -= len(tasks)
+                self._inflight += 1
+                self._site_inflight[key] = self._site_inflight.get(key, 0) + 1
+                self._executor.submit(self.__run, key, tasks)
+
+    def __run(self, key: str, tasks: List[Task]):
+        urls = [task[2] for task in tasks]
+        try:
+            results = self._handler(urls)
+        except Exception as err:
+            logger.error(f"处理种子 {', '.join(urls)} 出错：{err}")
+            results = [(TaskStatus.RETRY, str(err))] * len(tasks)
+        try:
+            for (task_id, _, _, attempts), (status, message) in zip(tasks, results):
+                self.__settle(key, task_id, attempts, status, message)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                self._site_inflight[key] -= 1
+                if not self._site_inflight[key]:
+                    del self._site_inflight[key]
+        for job_id in {task[1] for task in tasks}:
+            self.__check_job(job_id)
+        self.__pump()
+        # 仍有空闲的工作线程时取出更多任务，缓冲中可能只剩已达单站点并发上限的站点
+        with self._lock:
+            idle = self._inflight < self._max_workers
+        if idle:
+            self.tick()
+
+    def __settle(self, key: str, task_id: int, attempts: int, status: str, message: str):
+        """
+        记录任务结果，临时失败按退避时间放回队列
+        """
+        if status in (TaskStatus.ADDED, TaskStatus.SKIPPED):
+            if key:
+                self._queue.record_success(f"site:{key}")
+            self._queue.finish(task_id, status, message)
+            return
+        if status == TaskStatus.FAILED:
+            self._queue.finish(task_id, TaskState.FAILED, message)
+            return
+        attempts += 1
+        if attempts >= self._max_attempts:
+            self._queue.finish(task_id, TaskState.FAILED, f"重试 {attempts} 次后仍失败：{message}")
+            return
+        next_at = time.time() + self._queue.delay(attempts)
+        if status == TaskStatus.RETRY and key:
+            next_at = max(next_at, self._queue.record_failure(f"site:{key}"))
+        self._queue.retry(task_id, attempts, next_at, message)
+
+    def __check_job(self, job_id: str):
+        """
+        批量任务全部结束时回调
+        """
+        summary = self._queue.job_summary(job_id)
+        if not summary or not summary.get("done"):
+            return
+        with self._lock:
+            if job_id in self._finished_jobs:
+                return
+            self._finished_jobs.add(job_id)
+        if self._on_finish:
+            try:
+                self._on_finish(summary)
+            except Exception as err:
+                logger.error(f"批量任务 {job_id} 完成回调出错：{err}")
+
+    def shutdown(self):
+        """
+        停止调度，等待执行中的任务结束，未开始的任务留在队列中，下次启动时继续
+        """
+        self._stop_event.set()
+        with self._lock:
+            task_ids = [task[0] for queue in self._pending.values() for task in queue]
+            self._pending.clear()
+            self._buffered = 0
+        if task_ids:
+            self._queue.release(task_ids, 0)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from requests import Session
+
+from app.core.config import settings
+from app.log import logger
+from app.utils.http import RequestUtils
+
+from .bencode import BencodeError, TorrentMeta, scan_torrent
+from .ratelimit import SiteRateLimiter
+
+# 等待限流时插件退出，未请求站点
+ABORTED = "插件正在停止"
+
+
+class TorrentCache:
+    """
+    按总字节数限制大小的种子文件 LRU 缓存，按链接查询
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 链接 -> (种子摘要, 种子内容)
+        self._items: "OrderedDict[str, Tuple[TorrentMeta, bytes]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, url: str) -> Optional[Tuple[TorrentMeta, bytes]]:
+        with self._lock:
+            item = self._items.get(url)
+            if item:
+                self._items.move_to_end(url)
+            return item
+
+    def put(self, url: str, meta: TorrentMeta, content: bytes):
+        if len(content) > self._max_bytes:
+            return
+        with self._lock:
+            self.__remove(url)
+            self._items[url] = (meta, content)
+            self._size += len(content)
+            while self._size > self._max_bytes:
+                self.__remove(next(iter(self._items)))
+
+    def __remove(self, url: str):
+        item = self._items.pop(url, None)
+        if not item:
+            return
+        self._size -= len(item[1])
+
+
+class TorrentFetcher:
+    """
+    预先下载种子文件，每个站点域名复用一个保持连接的会话，下载结果写入缓存
+    """
+
+    def __init__(self, cache: TorrentCache, limiter: Optional[SiteRateLimiter] = None, timeout: int = 30):
+        self.cache = cache
+        self._limiter = limiter
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Session] = {}
+
+    def __session(self, domain: str) -> Session:
+        with self._lock:
+            session = self._sessions.get(domain)
+            if not session:
+                session = Session()
+                self._sessions[domain] = session
+            return session
+
+    def fetch(self, url: str, domain: str, cookie: Optional[str] = None, ua: Optional[str] = None,
+              proxy: bool = False) -> Tuple[Optional[TorrentMeta], Optional[bytes], str]:
+        """
+        下载种子文件
+        :return: 种子摘要、种子内容、失败原因
+        """
+        cached = self.cache.get(url)
+        if cached:
+            return cached[0], cached[1], ""
+        if self._limiter and not self._limiter.acquire(domain):
+            return None, None, ABORTED
+        res = RequestUtils(cookies=cookie,
+                           ua=ua or settings.USER_AGENT,
+                           proxies=settings.PROXY if proxy else None,
+                           session=self.__session(domain),
+                           timeout=self._timeout).get_res(url)
+        if res is None:
+            return None, None, "无法连接站点"
+        if res.status_code != 200:
+            return None, None, f"站点返回状态码 {res.status_code}"
+        content = res.content
+        # 未登录、限流等情况站点会返回网页而不是种子
+        if not content or not content.startswith(b"d"):
+            return None, None, "站点返回的不是种子文件"
+        try:
+            meta = scan_torrent(content)
+        except BencodeError as err:
+            logger.debug(f"解析种子 {url} 失败：{err}")
+            return None, None, "种子文件解析失败"
+        self.cache.put(url, meta, content)
+        return meta, content, ""
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
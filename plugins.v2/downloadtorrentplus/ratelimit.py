@@ -0,0 +1,90 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """
+    令牌桶，容量为突发请求数，按固定速率补充
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: 每秒补充的令牌数
+        :param burst: 桶容量
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        预定一个令牌，返回需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class SiteRateLimiter:
+    """
+    按站点域名限制请求频率，每个站点一个令牌桶，等待只发生在调用线程上，
+    某个站点限流不会阻塞其它站点的请求
+    """
+
+    def __init__(self, rate: float, burst: int,
+                 site_limits: Optional[Callable[[str], Optional[Tuple[float, int]]]] = None,
+                 stop_event: Optional[threading.Event] = None):
+        """
+        :param rate: 默认每秒请求数
+        :param burst: 默认突发请求数
+        :param site_limits: 按域名返回站点自身的 (每秒请求数, 突发请求数)，未设置返回 None
+        :param stop_event: 退出事件，置位后不再等待
+        """
+        self._rate = rate
+        self._burst = burst
+        self._site_limits = site_limits
+        self._stop_event = stop_event or threading.Event()
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+
+    def __bucket(self, domain: str) -> Optional[TokenBucket]:
+        """
+        站点的令牌桶，优先使用站点自身的流控；站点未设置且默认速率为 0 时不限流，返回 None
+        """
+        with self._lock:
+            if domain in self._buckets:
+                return self._buckets[domain]
+        limits = self._site_limits(domain) if self._site_limits else None
+        rate, burst = limits or (self._rate, self._burst)
+        with self._lock:
+            return self._buckets.setdefault(domain, TokenBucket(rate=rate, burst=burst) if rate > 0 else None)
+
+    def acquire(self, domain: str) -> bool:
+        """
+        等待站点令牌
+        :return: 是否取得令牌，等待期间退出时返回 False，调用方不应再请求站点
+        """
+        if self._stop_event.is_set():
+            return False
+        bucket = self.__bucket(domain) if domain else None
+        if not bucket:
+            return True
+        wait = bucket.reserve()
+        if wait > 0 and self._stop_event.wait(wait):
+            return False
+        return True
+
+    def reset(self):
+        """
+        站点配置变化后重建令牌桶
+        """
+        with self._lock:
+            self._buckets.clear()
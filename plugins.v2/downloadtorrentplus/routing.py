@@ -0,0 +1,83 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from app.log import logger
+
+
+@dataclass
+class DownloaderLoad:
+    """
+    下载器负载
+    """
+    name: str
+    # 活动种子数
+    active: int = 0
+    # 剩余空间（字节），未知为 None
+    free_space: Optional[int] = None
+    # 下载速度（字节/秒）
+    download_speed: int = 0
+    # 上传速度（字节/秒）
+    upload_speed: int = 0
+    updated_at: float = 0.0
+
+
+class LoadRouter:
+    """
+    按缓存的下载器负载为每个种子选择目标下载器
+    负载由后台定时探测刷新，两次探测之间分配出去的种子计入活动数，避免同一批种子全部落到同一个下载器
+    """
+    # 下载速度折算为活动种子数的单位（字节/秒）
+    speed_unit = 5 * 1024 * 1024
+
+    def __init__(self, probe: Callable[[str], Optional[DownloaderLoad]], ttl: int = 300):
+        """
+        :param probe: 查询下载器负载，下载器不可用返回 None
+        :param ttl: 负载数据有效期（秒），超过后在选择时同步刷新
+        """
+        self._probe = probe
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._loads: Dict[str, Optional[DownloaderLoad]] = {}
+        self._assigned: Dict[str, int] = {}
+        self._refreshed_at: Dict[str, float] = {}
+
+    def refresh(self, names: List[str]):
+        """
+        探测下载器负载
+        """
+        for name in names:
+            try:
+                load = self._probe(name)
+            except Exception as err:
+                logger.warning(f"探测下载器 {name} 负载失败：{err}")
+                load = None
+            with self._lock:
+                self._loads[name] = load
+                self._assigned[name] = 0
+                self._refreshed_at[name] = time.time()
+
+    def score(self, load: DownloaderLoad) -> float:
+        """
+        负载评分，越小越空闲
+        """
+        return load.active + self._assigned.get(load.name, 0) + load.download_speed / self.speed_unit
+
+    def pick(self, names: List[str], size: int = 0) -> Optional[str]:
+        """
+        选择负载最低且剩余空间足够的下载器
+        """
+        stale = [name for name in names if time.time() - self._refreshed_at.get(name, 0) > self._ttl]
+        if stale:
+            self.refresh(stale)
+        with self._lock:
+            candidates = [load for load in (self._loads.get(name) for name in names)
+                          if load and (load.free_space is None or load.free_space >= size)]
+            if not candidates:
+                return None
+            best = min(candidates, key=lambda load: (self.score(load), -(load.free_space or 0)))
+            self._assigned[best.name] = self._assigned.get(best.name, 0) + 1
+            if size and best.free_space is not None:
+                best.free_space -= size
+            return best.name
@@ -0,0 +1,80 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from app.log import logger
+
+
+@dataclass(frozen=True)
+class SiteEntry:
+    """
+    站点索引项，只保留添加种子需要的字段
+    """
+    id: int
+    name: str
+    domain: str
+    cookie: Optional[str] = None
+    ua: Optional[str] = None
+    proxy: bool = False
+    pri: int = 0
+    # 站点流控：单位周期（秒）、周期内访问次数、访问间隔（秒）
+    limit_interval: int = 0
+    limit_count: int = 0
+    limit_seconds: int = 0
+
+
+class SiteIndex:
+    """
+    域名 -> 站点 的内存索引
+    由 SiteOper 一次性全量构建，站点变更事件或超过有效期后重建；
+    索引是全量快照，未收录的域名同样直接返回，不会再逐个查询数据库
+    """
+
+    def __init__(self, loader: Callable[[], List[Any]], ttl: int = 600):
+        """
+        :param loader: 返回全部站点，一般为 SiteOper().list
+        :param ttl: 索引有效期（秒）
+        """
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._index: Dict[str, SiteEntry] = {}
+        self._built_at = 0.0
+
+    def invalidate(self):
+        """
+        使索引失效，下次查询时重建
+        """
+        with self._lock:
+            self._built_at = 0.0
+
+    def get(self, domain: str) -> Optional[SiteEntry]:
+        """
+        按域名查询站点，未收录返回 None
+        """
+        if not domain:
+            return None
+        with self._lock:
+            if time.time() - self._built_at > self._ttl:
+                self.__build()
+            return self._index.get(domain)
+
+    def __build(self):
+        index = {}
+        for site in self._loader() or []:
+            if not site or not site.domain:
+                continue
+            index[site.domain] = SiteEntry(id=site.id,
+                                           name=site.name,
+                                           domain=site.domain,
+                                           cookie=site.cookie,
+                                           ua=site.ua,
+                                           proxy=bool(site.proxy),
+                                           pri=site.pri or 0,
+                                           limit_interval=site.limit_interval or 0,
+                                           limit_count=site.limit_count or 0,
+                                           limit_seconds=site.limit_seconds or 0)
+        self._index = index
+        self._built_at = time.time()
+        logger.debug(f"站点索引已重建，共 {len(index)} 个站点")
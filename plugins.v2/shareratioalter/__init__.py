@@ -9,11 +9,20 @@ from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType
 from app.core.event import eventmanager, Event
+from app.utils.string import StringUtils
 from app.db.models.siteuserdata import SiteUserData
 from app.schemas import Notification, NotificationType, MessageChannel
+from datetime import datetime
 from pathlib import Path
 import json
 import os
+import threading
+import time
+
+from .alerts import AlertState, AlertTracker, Transition
+from .forecast import forecast
+from .history import RatioHistory
+from .metrics import MetricRule, build_columns, evaluate, history_days, parse_rules
 
 
 # 获取当前文件的路径
@@ -29,7 +38,7 @@ class ShareRatioAlter(_PluginBase):
     # 插件图标
     plugin_icon = "world.png"
     # 插件版本
-    plugin_version = "1.0.2"
+    plugin_version = "1.7.0"
     # 插件作者
     plugin_author = "velor2012"
     # 作者主页
@@ -53,9 +62,34 @@ class ShareRatioAlter(_PluginBase):
     _enabled = False
     _onlyonce: bool = False
     _record_change = False
+    # 趋势预警：提前多少天预警、按最近多少天的数据拟合
+    _forecast = False
+    _forecast_days = 7
+    _forecast_window = 14
+    # 告警状态机：回差、同一站点通知冷却时间（小时）、汇总周期（小时）
+    _hysteresis = 0.05
+    _cooldown_hours = 6
+    _digest_hours = 24
+    _alerts: Optional[AlertTracker] = None
+    # 多指标规则及其告警状态，状态以 站点|规则 为键
+    _metric_rules: List[MetricRule] = []
+    _metric_alerts: Optional[AlertTracker] = None
+    # 单站点刷新的防抖：窗口内刷新的站点合并为一次检查
+    _debounce_seconds = 10
+    # 等待检查的站点：站点名称 -> 域名
+    _pending_sites: Dict[str, str] = {}
+    _debounce_timer: Optional[threading.Timer] = None
+    _debounce_lock = threading.Lock()
+    # 首个站点登记后最多等待的时间，持续刷新时也按时检查
+    _debounce_deadline = 0.0
+    # 检查与退出互斥，避免检查过程中分享率历史被关闭
+    _check_lock = threading.Lock()
     
+    # 旧版本保存上次数据的文件，启动时导入分享率历史后删除
     lastDataFile = os.path.join(current_dir, 'lastData.json')
-    _lastData = {}
+    # 分享率历史
+    _history: Optional[RatioHistory] = None
+    _compacted_at = 0
     
     def init_plugin(self, config: dict = None):
         self.site_oper = SiteOper()
@@ -63,23 +97,25 @@ class ShareRatioAlter(_PluginBase):
         # 站点选项
         self.site_options = self.__get_site_options()
         # self.active_sites = self.__get_enable_site_ids()
-        # 读取lastDataFile的json内容到_lastData中
-
-        if os.path.exists(self.lastDataFile):
-            with open(self.lastDataFile, 'r') as f:
-                self._lastData = json.load(f)
-        else:
-            self._lastData = {}
-            # 写入lastDataFile
-            with open(self.lastDataFile, 'w') as f:
-                json.dump(self._lastData, f)
-        logger.info(f"{self.LOG_TAG} 加载上次数据: {self._lastData}")
+        with self._check_lock:
+            if self._history:
+                self._history.close()
+            self._history = RatioHistory(self.get_data_path() / "ratio_history.db")
+        self.__import_last_data()
                 
         # 读取配置
         if config:
             self._enabled = config.get("enabled")
             self._onlyonce = config.get("onlyonce")
             self._record_change = config.get("record_change")
+            self._forecast = config.get("forecast")
+            self._forecast_days = float(config.get("forecast_days") or 7)
+            self._forecast_window = float(config.get("forecast_window") or 14)
+            self._debounce_seconds = float(config.get("debounce_seconds") or 10)
+            self._hysteresis = self.__to_float(config.get("hysteresis"), 0.05)
+            self._cooldown_hours = self.__to_float(config.get("cooldown_hours"), 6)
+            self._digest_hours = self.__to_float(config.get("digest_hours"), 24)
+            self._metric_rules = parse_rules((config.get("metric_rules") or "").split("\n"))
             logger.info('2', config)
             self.sites_config = {}
             for site in self.site_options:
@@ -90,6 +126,16 @@ class ShareRatioAlter(_PluginBase):
                         "enabled": config.get(f"{site['name']}_enabled", False),
                         "ratio": float(config.get(f"{site['name']}_ratio", -1)),
                     }
+        # 恢复上次的告警状态
+        self._alerts = AlertTracker(states=self.get_data("alert_state"),
+                                    hysteresis=self._hysteresis,
+                                    cooldown=self._cooldown_hours * 3600)
+        enabled_sites = [name for name, conf in self.sites_config.items() if conf['enabled']]
+        self._alerts.retain(enabled_sites)
+        self._metric_alerts = AlertTracker(states=self.get_data("metric_alert_state"),
+                                           cooldown=self._cooldown_hours * 3600)
+        self._metric_alerts.retain([f"{name}|{rule.text}" for name in enabled_sites
+                                    for rule in self._metric_rules if rule.applies(name)])
         if self._onlyonce:
             config["onlyonce"] = False
             self.check_sites_and_send()
@@ -97,107 +143,309 @@ class ShareRatioAlter(_PluginBase):
             
         logger.info(f"插件原始配置: config: {config}")
         logger.info(f"插件配置 sites_config: {self.sites_config}")
+
+    @staticmethod
+    def __to_float(value: Any, default: float) -> float:
+        try:
+            return float(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
     @eventmanager.register(EventType.SiteRefreshed)
     def send_msg(self, event: Event):
         """
         站点数据刷新事件时发送消息
+        全部站点刷新时检查全部站点；单个站点刷新时登记站点，防抖窗口结束后只检查登记的站点
         """
-        logger.info(f"{self.LOG_TAG} 站点数据刷新,  event.event_data : ",  event.event_data )
+        logger.info(f"{self.LOG_TAG} 站点数据刷新,  event.event_data : {event.event_data}")
+        if not self._enabled or not event.event_data:
+            return
+        site_id = event.event_data.get('site_id')
+        if site_id == "*":
+            with self._debounce_lock:
+                # 全量检查覆盖了等待中的站点
+                self._pending_sites.clear()
+                if self._debounce_timer:
+                    self._debounce_timer.cancel()
+                    self._debounce_timer = None
+            self.check_sites_and_send()
+            return
+        site = next((site for site in self.site_options if str(site['id']) == str(site_id)), None)
+        if not site or not self.sites_config.get(site['name'], {}).get('enabled'):
+            return
+        with self._debounce_lock:
+            if not self._pending_sites:
+                self._debounce_deadline = time.time() + self._debounce_seconds * 6
+            self._pending_sites[site['name']] = site['domain']
+            if self._debounce_timer:
+                self._debounce_timer.cancel()
+            delay = max(0.0, min(self._debounce_seconds, self._debounce_deadline - time.time()))
+            self._debounce_timer = threading.Timer(delay, self.__check_pending_sites)
+            self._debounce_timer.daemon = True
+            self._debounce_timer.start()
 
-        if event.event_data.get('site_id') != "*":
+    def __check_pending_sites(self):
+        """
+        防抖窗口结束，检查窗口内刷新过的站点
+        """
+        with self._debounce_lock:
+            pending = dict(self._pending_sites)
+            self._pending_sites.clear()
+            self._debounce_timer = None
+        if not pending:
             return
-        self.check_sites_and_send()
+        res = [data for data in (self.__get_site_data(name, domain) for name, domain in pending.items()) if data]
+        logger.info(f"{self.LOG_TAG} 站点数据: {res}")
+        if res:
+            with self._check_lock:
+                if self._history:
+                    self.__evaluate(res)
+
+    def __import_last_data(self):
+        """
+        旧版本的 lastData.json 导入为一条历史采样
+        """
+        if not os.path.exists(self.lastDataFile):
+            return
+        try:
+            with open(self.lastDataFile, 'r') as f:
+                last_data = json.load(f) or {}
+            self._history.append([(name, data['ratio'], data.get('upload'), data.get('download'))
+                                  for name, data in last_data.items()],
+                                 ts=int(os.path.getmtime(self.lastDataFile)))
+            os.remove(self.lastDataFile)
+            logger.info(f"{self.LOG_TAG} 已导入上次数据: {len(last_data)} 个站点")
+        except Exception as e:
+            logger.error(f"{self.LOG_TAG} 导入上次数据失败: {str(e)}")
 
     def check_sites_and_send(self):
         """
         检查站点是否需要发送通知
         """
-        # 消息内容
-        messages = []
         # 获取站点数据
         res = self.__get_data()
         logger.info(f"{self.LOG_TAG} 站点数据: {res}")
-        
-        cur_data = {}
-        
+        with self._check_lock:
+            if self._history:
+                self.__evaluate(res)
+
+    def __evaluate(self, res: List[Dict[str, Any]]):
+        """
+        检查给定站点的数据，只在告警状态变化时发送通知，并记录到分享率历史
+        """
+        now = int(time.time())
+        sites = [data['name'] for data in res if data['ratio'] >= 0]
+        # 不定期汇总时，分享率变化在每次检查时通知
+        change_messages = []
+        if self._record_change and self._digest_hours <= 0:
+            last_samples = self._history.latest(sites=sites)
+            for data in res:
+                last_data = last_samples.get(data['name'])
+                if data['ratio'] < 0 or not last_data:
+                    continue
+                change_ratio = round(abs(last_data.ratio - data['ratio']), 3)
+                if change_ratio > 0.001:
+                    change_messages.append(f"【{data['name']}】 当前分享率: {data['ratio']}   "
+                                           f"{change_ratio}{'↑' if data['ratio'] > last_data.ratio else '↓'}")
+
+        # 先记录本次数据到分享率历史并更新数据页的站点汇总，趋势预测包含最新采样
+        self._history.append([(data['name'], data['ratio'], data['upload'], data['download'],
+                               data.get('seeding'), data.get('seeding_size'), data.get('bonus'))
+                              for data in res if data['ratio'] >= 0], ts=now)
+        # 趋势预测与指标规则共用一次历史查询，在追加本次采样之后读取
+        window = max(self._forecast_window if self._forecast else 0, history_days(self._metric_rules))
+        series = self._history.series_since(int(now - window * 86400), sites=sites) if window > 0 else {}
+        # 趋势预测：站点 -> 预计多少天后低于阈值
+        etas = self.__forecast_etas(res, series, now) if self._forecast else {}
+        self._history.update_etas(sites, etas)
+        # 消息内容，按状态变化分类
+        messages: Dict[str, List[str]] = {Transition.WARNING: [], Transition.FORECAST: [], Transition.RECOVERED: []}
+
         # 获取每个站点的分享率
         for data in res:
             if data['ratio'] < 0:
                 continue
             target_ratio = self.sites_config[data['name']]['ratio']
             
-            # 记录本次数据，保存到cur_data中
-            cur_data[data['name']] = data
-            
             logger.info(f"{self.LOG_TAG} 站点分享率: {data['name']} 分享率: {data['ratio']} 设置阈值为： {target_ratio}")
-            if target_ratio > 0 and data['ratio'] < target_ratio:
-                # 发送通知
-                logger.info(f"{self.LOG_TAG} 发送通知: {data['name']} 分享率: {data['ratio']} 设置阈值为： {target_ratio}")
-                messages.append(f"{data['name']} 分享率 【过低！！ \n" + 
-                            f"分享率: {data['ratio']} 设置阈值为： {target_ratio}\n" +
-                            f"————————————")
-                
-        # 发送站点分享率变化通知
-        record_change_mgs = []
-        if self._record_change:
-            for data in res:
-                if data['ratio'] < 0:
-                    continue
-                if data['name'] in self._lastData.keys():
-                    last_data = self._lastData[data['name']]
-                    change_ratio = round(abs(last_data['ratio'] - data['ratio']), 3)
-                    if change_ratio > 0.001:
-                        record_change_mgs.append(f"【{data['name']}】 " +
-                                    f"当前分享率: {data['ratio']}   {change_ratio}{'↑' if data['ratio'] > last_data['ratio'] else '↓'}\n")
-               
-        if len(record_change_mgs) > 0:
+            eta = etas.get(data['name'])
+            transition = self._alerts.update(data['name'], data['ratio'], target_ratio,
+                                             eta_days=eta, horizon=self._forecast_days)
+            if not transition:
+                continue
             # 发送通知
+            logger.info(f"{self.LOG_TAG} 发送通知: {data['name']} {transition} 分享率: {data['ratio']} 设置阈值为： {target_ratio}")
+            if transition == Transition.WARNING:
+                messages[transition].append(f"{data['name']} 分享率 【过低！！ \n" +
+                                            f"分享率: {data['ratio']} 设置阈值为： {target_ratio}\n" +
+                                            f"————————————")
+            elif transition == Transition.FORECAST:
+                messages[transition].append(f"【{data['name']}】 当前分享率: {data['ratio']}\n" +
+                                            f"预计 ~{max(1, round(eta))} 天后低于 {target_ratio}\n" +
+                                            f"————————————")
+            else:
+                messages[transition].append(f"【{data['name']}】 分享率已恢复: {data['ratio']} 设置阈值为： {target_ratio}")
+        self.save_data("alert_state", self._alerts.dump())
+        metric_messages = self.__evaluate_metrics(res, series, now)
+        # 每小时降采样一次
+        if time.time() - self._compacted_at > 3600:
+            self._history.compact()
+            self._compacted_at = time.time()
+
+        for transition, title in ((Transition.WARNING, "站点分享率过低告警"),
+                                  (Transition.FORECAST, "站点分享率趋势预警"),
+                                  (Transition.RECOVERED, "站点分享率已恢复")):
+            if messages[transition]:
+                self.post_message(mtype=NotificationType.SiteMessage,
+                                  title=title, text="\n".join(messages[transition]))
+        if change_messages:
             self.post_message(mtype=NotificationType.SiteMessage,
-                                title="站点分享率变化", text="\n".join(record_change_mgs))
-            
-        # 写入lastDataFile
-        with open(self.lastDataFile, 'w') as f:
-            json.dump(cur_data, f)     
-        self._lastData = cur_data      
-                        
-        if len(messages) > 0:
-            # 发送通知
+                              title="站点分享率变化", text="\n".join(change_messages))
+        for transition, title in ((Transition.WARNING, "站点指标告警"),
+                                  (Transition.RECOVERED, "站点指标恢复")):
+            if metric_messages[transition]:
+                self.post_message(mtype=NotificationType.SiteMessage,
+                                  title=title, text="\n".join(metric_messages[transition]))
+
+    def __evaluate_metrics(self, res: List[Dict[str, Any]], series: Dict[str, list],
+                           now: int) -> Dict[str, List[str]]:
+        """
+        按最新数据及历史生成各指标的列，逐条规则整列比较，返回按状态变化分类的消息
+        """
+        messages: Dict[str, List[str]] = {Transition.WARNING: [], Transition.RECOVERED: []}
+        if not self._metric_rules:
+            return messages
+        snapshot = [data for data in res if data['ratio'] >= 0]
+        breached = evaluate(self._metric_rules, build_columns(snapshot, series, now))
+        for data in snapshot:
+            name = data['name']
+            for rule in self._metric_rules:
+                if not rule.applies(name):
+                    continue
+                transition = self._metric_alerts.update_condition(f"{name}|{rule.text}",
+                                                                  rule.text in breached.get(name, []))
+                if not transition:
+                    continue
+                logger.info(f"{self.LOG_TAG} 指标规则: {name} {rule.text} {transition}")
+                if transition == Transition.WARNING:
+                    messages[transition].append(f"【{name}】 触发规则: {rule.text}")
+                else:
+                    messages[transition].append(f"【{name}】 已恢复: {rule.text}")
+        self.save_data("metric_alert_state", self._metric_alerts.dump())
+        return messages
+
+    def __forecast_etas(self, res: List[Dict[str, Any]], series: Dict[str, list], now: int) -> Dict[str, float]:
+        """
+        按最近的上传、下载趋势预测分享率，返回预计会低于阈值的站点及天数
+        """
+        thresholds = {data['name']: self.sites_config[data['name']]['ratio'] for data in res if data['ratio'] >= 0}
+        # 历史查询范围可能因指标规则而更长，只取趋势统计天数内的采样
+        since = now - self._forecast_window * 86400
+        series = {site: [sample for sample in samples if sample.ts >= since]
+                  for site, samples in series.items() if site in thresholds}
+        etas = {}
+        for result in forecast(series, thresholds):
+            if result.eta_days is None:
+                continue
+            logger.info(f"{self.LOG_TAG} 分享率预测: {result.site} 当前: {result.ratio} "
+                        f"预计 {result.eta_days:.1f} 天后低于 {result.threshold}")
+            etas[result.site] = result.eta_days
+        return etas
+
+    def send_digest(self):
+        """
+        定期汇总：仍处于告警、预警状态的站点及上次汇总以来恢复的站点，开启记录变化时附带上次汇总以来的分享率变化
+        """
+        if not self._history or not self._alerts:
+            return
+        now = int(time.time())
+        last_digest = self.get_data("digest_at") or now - int(self._digest_hours * 3600)
+        latest = self._history.latest(sites=[name for name, conf in self.sites_config.items() if conf['enabled']])
+        lines = []
+        for name in self._alerts.sites(AlertState.WARNING):
+            if name in latest:
+                lines.append(f"【{name}】 分享率过低: {latest[name].ratio} 设置阈值为： {self.sites_config[name]['ratio']}")
+        for name in self._alerts.sites(AlertState.FORECAST):
+            if name in latest:
+                lines.append(f"【{name}】 分享率趋势下降: {latest[name].ratio} 设置阈值为： {self.sites_config[name]['ratio']}")
+        # 冷却期内恢复的站点没有单独通知，在汇总中补充
+        for name in self._alerts.recovered_since(last_digest):
+            if name in latest:
+                lines.append(f"【{name}】 分享率已恢复: {latest[name].ratio} 设置阈值为： {self.sites_config[name]['ratio']}")
+        if self._record_change:
+            for name, sample in latest.items():
+                before = self._history.sample_at(name, last_digest)
+                if not before:
+                    continue
+                change_ratio = round(abs(sample.ratio - before.ratio), 3)
+                if change_ratio > 0.001:
+                    lines.append(f"【{name}】 当前分享率: {sample.ratio}   "
+                                 f"{change_ratio}{'↑' if sample.ratio > before.ratio else '↓'}")
+        self.save_data("digest_at", now)
+        if lines:
             self.post_message(mtype=NotificationType.SiteMessage,
-                                title="站点分享率过低告警", text="\n".join(messages))
+                              title="站点分享率汇总", text="\n".join(lines))
+
     def __get_data(self) -> Tuple[str, List[SiteUserData], List[SiteUserData]]:
         """
         获取每个站点的分享率，并返回
         """
-        # 获取所有原始数据
-        raw_data_list: List[SiteUserData] = self.site_oper.get_userdata()
         # 每个站点只获取最近一条数据
-        sorted_data_list: List[SiteUserData] = sorted(raw_data_list, key=lambda x: x.updated_day, reverse=False)
-        processed_data_list = list(
-            {
-                f"{data.name}":
-                {
+        latest_data_list: List[SiteUserData] = self.__get_latest_userdata()
+        res = []
+        for data in latest_data_list:
+            if data.ratio is None:
+                continue
+            if data.name in self.sites_config.keys() and self.sites_config[data.name]['enabled']:
+                res.append({
                     "name": data.name,
                     "ratio": round(data.ratio, 2),
                     "upload": data.upload,
                     "download": data.download,
-                } for data in sorted_data_list
-            }.values())
-        res = []
-        for data in processed_data_list:
-            if data['name'] in self.sites_config.keys() and self.sites_config[data['name']]['enabled']:
-                res.append({
-                    "name": data['name'],
-                    "ratio": data['ratio'],
-                    "upload": data['upload'],
-                    "download": data['download'],
+                    "seeding": data.seeding,
+                    "seeding_size": data.seeding_size,
+                    "bonus": data.bonus,
                 })
-            else:
-                data['ratio'] = -1
-            
+
         # 排序
         res.sort(key=lambda x: x['ratio'], reverse=True)
         return res
-        
+
+    def __get_site_data(self, name: str, domain: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单个站点最近一条数据，按域名只查询该站点当天的数据，当天没有数据时查询该站点的全部数据
+        """
+        data_list: List[SiteUserData] = self.site_oper.get_userdata_by_domain(
+            domain, workdate=datetime.now().strftime('%Y-%m-%d')) or []
+        if not data_list:
+            data_list = self.site_oper.get_userdata_by_domain(domain) or []
+        data = max(data_list, key=lambda x: (x.updated_day or "", x.updated_time or ""), default=None)
+        if not data or data.ratio is None:
+            return None
+        return {
+            "name": name,
+            "ratio": round(data.ratio, 2),
+            "upload": data.upload,
+            "download": data.download,
+            "seeding": data.seeding,
+            "seeding_size": data.seeding_size,
+            "bonus": data.bonus,
+        }
+
+    def __get_latest_userdata(self) -> List[SiteUserData]:
+        """
+        获取每个站点最近一条用户数据
+        优先使用按站点分组的查询，只返回每个站点的最新一条；旧版本主程序没有该查询时，
+        退化为遍历全部历史数据，一次遍历取每个站点最新的一条
+        """
+        if hasattr(self.site_oper, "get_userdata_latest"):
+            return self.site_oper.get_userdata_latest() or []
+        latest: Dict[str, SiteUserData] = {}
+        for data in self.site_oper.get_userdata() or []:
+            current = latest.get(data.name)
+            if not current or (data.updated_day or "") >= (current.updated_day or ""):
+                latest[data.name] = data
+        return list(latest.values())
 
     def post_message(self, channel: MessageChannel = None, mtype: NotificationType = None, title: Optional[str] = None,
                      text: Optional[str] = None, image: Optional[str] = None, link: Optional[str] = None,
@@ -291,7 +539,8 @@ class ShareRatioAlter(_PluginBase):
                                         'component': 'VSwitch',
                                         'props': {
                                             'model': "record_change",
-                                            'label': '记录变化'
+                                            'label': '记录变化',
+                                            'hint': '在定期汇总中附带分享率变化，不汇总时每次检查通知'
                                         }   
                                     }
                                 ]
@@ -314,6 +563,140 @@ class ShareRatioAlter(_PluginBase):
                         }
                     ]
             },
+            {
+                'component': 'VRow',
+                    'content': [
+                        {
+                            'component': 'VCol',
+                            'props': {
+                                'cols': 12,
+                                'md': 3
+                            },
+                            'content': [
+                                {
+                                    'component': 'VSwitch',
+                                    'props': {
+                                        'model': 'forecast',
+                                        'label': '趋势预警'
+                                    }
+                                }
+                            ]
+                        },
+                        {
+                            'component': 'VCol',
+                            'props': {
+                                'cols': 12,
+                                'md': 3
+                            },
+                            'content': [
+                                {
+                                    'component': 'VTextField',
+                                    'props': {
+                                        'model': 'forecast_days',
+                                        'label': '提前预警天数',
+                                        'type': 'number',
+                                        'hint': '预计在此天数内低于阈值时通知'
+                                    }
+                                }
+                            ]
+                        },
+                        {
+                            'component': 'VCol',
+                            'props': {
+                                'cols': 12,
+                                'md': 3
+                            },
+                            'content': [
+                                {
+                                    'component': 'VTextField',
+                                    'props': {
+                                        'model': 'forecast_window',
+                                        'label': '趋势统计天数',
+                                        'type': 'number',
+                                        'hint': '按最近多少天的上传、下载量拟合趋势'
+                                    }
+                                }
+                            ]
+                        },
+                        {
+                            'component': 'VCol',
+                            'props': {
+                                'cols': 12,
+                                'md': 3
+                            },
+                            'content': [
+                                {
+                                    'component': 'VTextField',
+                                    'props': {
+                                        'model': 'debounce_seconds',
+                                        'label': '单站点刷新合并秒数',
+                                        'type': 'number',
+                                        'hint': '窗口内刷新的站点合并为一次检查，持续刷新时最多等待 6 倍时间'
+                                    }
+                                }
+                            ]
+                        }
+                    ]
+            },
+            {
+                'component': 'VRow',
+                    'content': [
+                        {
+                            'component': 'VCol',
+                            'props': {
+                                'cols': 12,
+                                'md': 4
+                            },
+                            'content': [
+                                {
+                                    'component': 'VTextField',
+                                    'props': {
+                                        'model': 'hysteresis',
+                                        'label': '恢复回差',
+                                        'type': 'number',
+                                        'hint': '分享率回升到 阈值+回差 以上才视为恢复'
+                                    }
+                                }
+                            ]
+                        },
+                        {
+                            'component': 'VCol',
+                            'props': {
+                                'cols': 12,
+                                'md': 4
+                            },
+                            'content': [
+                                {
+                                    'component': 'VTextField',
+                                    'props': {
+                                        'model': 'cooldown_hours',
+                                        'label': '通知冷却(小时)',
+                                        'type': 'number',
+                                        'hint': '同一站点两次通知的最小间隔'
+                                    }
+                                }
+                            ]
+                        },
+                        {
+                            'component': 'VCol',
+                            'props': {
+                                'cols': 12,
+                                'md': 4
+                            },
+                            'content': [
+                                {
+                                    'component': 'VTextField',
+                                    'props': {
+                                        'model': 'digest_hours',
+                                        'label': '汇总周期(小时)',
+                                        'type': 'number',
+                                        'hint': '定期汇总告警站点及分享率变化，0 为不汇总'
+                                    }
+                                }
+                            ]
+                        }
+                    ]
+            },
             {
                 'component': 'VRow',
                 'content': [
@@ -328,7 +711,33 @@ class ShareRatioAlter(_PluginBase):
                                 'props': {
                                     'type': 'info',
                                     'variant': 'tonal',
-                                    'text': '启用记录变化后每次收到站点数据都会发送通知（告知发生变化的指标），否则只会在分享率较低时发送通知'
+                                    'text': '告警只在状态变化时通知；启用记录变化后分享率变化附在定期汇总中，汇总周期为 0 时每次收到站点数据都会通知变化'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextarea',
+                                'props': {
+                                    'model': 'metric_rules',
+                                    'label': '指标规则',
+                                    'rows': 4,
+                                    'placeholder': '*:bonus<10000\nHDSky:upload_daily<10G\n*:no_upload_days>=3',
+                                    'hint': '每行一条 站点:指标 比较符 数值，站点为 * 时对全部监控站点生效；'
+                                            '指标：ratio、upload、download、seeding、seeding_size、bonus，'
+                                            '近 24 小时增量 upload_daily、download_daily、seeding_size_daily、bonus_daily，'
+                                            '连续无上传天数 no_upload_days；体积可用 K/M/G/T 单位'
                                 }
                             }
                         ]
@@ -340,6 +749,14 @@ class ShareRatioAlter(_PluginBase):
             "enabled": False,
             "onlyonce": False,
             "record_change": False,
+            "forecast": False,
+            "forecast_days": 7,
+            "forecast_window": 14,
+            "debounce_seconds": 10,
+            "hysteresis": 0.05,
+            "cooldown_hours": 6,
+            "digest_hours": 24,
+            "metric_rules": "",
             # 初始化下载器自定义标签配置
             **{f"{site['name']}_enabled": False for site in site_options}
         }
@@ -354,7 +771,8 @@ class ShareRatioAlter(_PluginBase):
             return []
         return [{
             'name': site.name,
-            'id': site.id
+            'id': site.id,
+            'domain': site.domain
         } for site in sites if site and site.is_active]
 
     # def __get_enable_site_ids(self) -> List[int]:
@@ -385,8 +803,146 @@ class ShareRatioAlter(_PluginBase):
         pass
 
 
+    def get_service(self) -> List[Dict[str, Any]]:
+        """
+        注册插件公共服务
+        """
+        if not self._enabled or self._digest_hours <= 0:
+            return []
+        return [{
+            "id": "ShareRatioAlterDigest",
+            "name": "站点分享率汇总",
+            "trigger": "interval",
+            "func": self.send_digest,
+            "kwargs": {"hours": self._digest_hours}
+        }]
+
     def get_page(self) -> List[dict]:
-        pass
+        """
+        数据页：各站点分享率走势、上传下载增量及预计低于阈值的时间，直接读取写入采样时更新的汇总
+        """
+        summaries = self._history.summaries() if self._history else {}
+        sites = [name for name, conf in self.sites_config.items() if conf['enabled'] and name in summaries]
+        if not sites:
+            return [{
+                'component': 'div',
+                'text': '暂无数据',
+                'props': {
+                    'class': 'text-center',
+                }
+            }]
+        warnings = set(self._alerts.sites(AlertState.WARNING)) if self._alerts else set()
+        forecasts = set(self._alerts.sites(AlertState.FORECAST)) if self._alerts else set()
+        cards = []
+        for name in sorted(sites, key=lambda x: summaries[x].ratio):
+            summary = summaries[name]
+            threshold = self.sites_config[name]['ratio']
+            color = 'error' if name in warnings else 'warning' if name in forecasts else 'success'
+            if summary.eta_days is not None:
+                eta = f"预计 ~{max(1, round(summary.eta_days))} 天后低于 {threshold}"
+            elif threshold > 0:
+                eta = f"阈值 {threshold}，暂无下降趋势"
+            else:
+                eta = "未设置阈值"
+            cards.append({
+                'component': 'VCol',
+                'props': {
+                    'cols': 12,
+                    'md': 6,
+                    'lg': 4
+                },
+                'content': [
+                    {
+                        'component': 'VCard',
+                        'props': {
+                            'variant': 'tonal',
+                        },
+                        'content': [
+                            {
+                                'component': 'VCardItem',
+                                'content': [
+                                    {
+                                        'component': 'VCardTitle',
+                                        'text': name
+                                    },
+                                    {
+                                        'component': 'VCardSubtitle',
+                                        'text': f"更新于 {datetime.fromtimestamp(summary.ts).strftime('%Y-%m-%d %H:%M')}"
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCardText',
+                                'content': [
+                                    {
+                                        'component': 'VChip',
+                                        'props': {
+                                            'color': color,
+                                            'size': 'small',
+                                            'class': 'mb-2'
+                                        },
+                                        'text': f"分享率 {summary.ratio}"
+                                    },
+                                    {
+                                        'component': 'VApexChart',
+                                        'props': {
+                                            'height': 60,
+                                            'options': {
+                                                'chart': {
+                                                    'type': 'line',
+                                                    'sparkline': {
+                                                        'enabled': True
+                                                    }
+                                                },
+                                                'stroke': {
+                                                    'curve': 'smooth',
+                                                    'width': 2
+                                                },
+                                                'xaxis': {
+                                                    'type': 'datetime'
+                                                },
+                                                'tooltip': {
+                                                    'x': {
+                                                        'format': 'yyyy-MM-dd'
+                                                    }
+                                                }
+                                            },
+                                            'series': [{
+                                                'name': '分享率',
+                                                'data': [[day * 1000, ratio] for day, ratio in summary.spark]
+                                            }]
+                                        }
+                                    },
+                                    {
+                                        'component': 'div',
+                                        'text': f"24小时 ↑{self.__format_size(summary.upload_day)} "
+                                                f"↓{self.__format_size(summary.download_day)}"
+                                    },
+                                    {
+                                        'component': 'div',
+                                        'text': f"7天 ↑{self.__format_size(summary.upload_week)} "
+                                                f"↓{self.__format_size(summary.download_week)}"
+                                    },
+                                    {
+                                        'component': 'div',
+                                        'text': eta
+                                    }
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            })
+        return [
+            {
+                'component': 'VRow',
+                'content': cards
+            }
+        ]
+
+    @staticmethod
+    def __format_size(size: Optional[int]) -> str:
+        return StringUtils.str_filesize(size) if size is not None else "-"
 
     def stop_service(self):
         """
@@ -394,6 +950,16 @@ class ShareRatioAlter(_PluginBase):
         """
         try:
             logger.info('尝试停止插件服务...')
+            with self._debounce_lock:
+                if self._debounce_timer:
+                    self._debounce_timer.cancel()
+                    self._debounce_timer = None
+                self._pending_sites.clear()
+            # 等待正在进行的检查结束后再关闭
+            with self._check_lock:
+                if self._history:
+                    self._history.close()
+                    self._history = None
             logger.info('插件服务停止完成')
         except Exception as e:
             logger.error(f"插件服务停止异常: {str(e)}", exc_info=True)
\ No newline at end of file
@@ -0,0 +1,157 @@
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+
+class AlertState:
+    """
+    站点告警状态
+    """
+    OK = "ok"
+    # 预计即将低于阈值
+    FORECAST = "forecast"
+    # 已低于阈值
+    WARNING = "warning"
+
+
+class Transition:
+    """
+    需要通知的状态变化
+    """
+    FORECAST = "forecast"
+    WARNING = "warning"
+    RECOVERED = "recovered"
+
+
+@dataclass
+class SiteAlert:
+    state: str = AlertState.OK
+    # 进入当前状态的时间
+    changed_at: float = 0.0
+    # 上次通知的时间
+    notified_at: float = 0.0
+    # 上次通知的状态
+    notified_state: str = AlertState.OK
+    # 上次从告警恢复的时间
+    recovered_at: float = 0.0
+
+
+class AlertTracker:
+    """
+    站点告警状态机，只在状态变化时通知
+    分享率低于阈值进入告警，回升到 阈值 + 回差 以上才恢复，避免在阈值附近反复通知；
+    同一站点两次通知至少间隔冷却时间，冷却期内的预警、恢复只记录不通知，由定期汇总补充；
+    进入告警不受冷却限制，已通知过告警且之后没有恢复时不重复通知
+    """
+
+    def __init__(self, states: Optional[Dict[str, Dict[str, Any]]] = None,
+                 hysteresis: float = 0.05, cooldown: float = 6 * 3600):
+        """
+        :param states: 上次保存的状态
+        :param hysteresis: 恢复时需要高出阈值的分享率
+        :param cooldown: 同一站点两次通知的最小间隔（秒）
+        """
+        self._hysteresis = hysteresis
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._alerts: Dict[str, SiteAlert] = {}
+        for site, state in (states or {}).items():
+            try:
+                self._alerts[site] = SiteAlert(**state)
+            except TypeError:
+                continue
+
+    def update(self, site: str, ratio: float, threshold: float,
+               eta_days: Optional[float] = None, horizon: Optional[float] = None) -> Optional[str]:
+        """
+        根据最新分享率及预测更新状态，返回需要通知的状态变化
+        :param eta_days: 预计多少天后低于阈值
+        :param horizon: 提前预警天数
+        """
+        if threshold is None or threshold <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            alert = self._alerts.setdefault(site, SiteAlert(changed_at=now))
+            predicted = eta_days is not None and horizon is not None and eta_days <= horizon
+            if alert.state == AlertState.WARNING:
+                if ratio < threshold + self._hysteresis:
+                    return None
+                new_state, transition = AlertState.OK, Transition.RECOVERED
+            elif ratio < threshold:
+                new_state, transition = AlertState.WARNING, Transition.WARNING
+            elif predicted:
+                if alert.state == AlertState.FORECAST:
+                    return None
+                new_state, transition = AlertState.FORECAST, Transition.FORECAST
+            elif alert.state == AlertState.FORECAST:
+                # 预测放宽到预警天数的 1.5 倍以外才解除，解除不通知
+                if eta_days is not None and horizon is not None and eta_days <= horizon * 1.5:
+                    return None
+                new_state, transition = AlertState.OK, None
+            else:
+                return None
+            alert.state, alert.changed_at = new_state, now
+            return self.__notify(alert, transition, now)
+
+    def update_condition(self, key: str, breached: bool) -> Optional[str]:
+        """
+        按条件是否满足更新状态，用于指标规则，返回需要通知的状态变化
+        """
+        now = time.time()
+        with self._lock:
+            alert = self._alerts.setdefault(key, SiteAlert(changed_at=now))
+            if breached == (alert.state == AlertState.WARNING):
+                return None
+            if breached:
+                alert.state, transition = AlertState.WARNING, Transition.WARNING
+            else:
+                alert.state, transition = AlertState.OK, Transition.RECOVERED
+            alert.changed_at = now
+            return self.__notify(alert, transition, now)
+
+    def __notify(self, alert: SiteAlert, transition: Optional[str], now: float) -> Optional[str]:
+        """
+        判断状态变化是否需要通知：进入告警总是通知，其余变化受冷却时间限制
+        """
+        if transition == Transition.RECOVERED:
+            alert.recovered_at = now
+        if alert.state == AlertState.OK:
+            # 恢复后无论是否通知，下次进入告警都需要通知
+            alert.notified_state = AlertState.OK
+        if not transition:
+            return None
+        if transition == Transition.WARNING:
+            if alert.notified_state == AlertState.WARNING:
+                return None
+        elif now - alert.notified_at < self._cooldown:
+            return None
+        alert.notified_at, alert.notified_state = now, alert.state
+        return transition
+
+    def sites(self, *states: str) -> List[str]:
+        """
+        处于指定状态的站点
+        """
+        with self._lock:
+            return [site for site, alert in self._alerts.items() if alert.state in states]
+
+    def recovered_since(self, since: float) -> List[str]:
+        """
+        指定时间之后从告警恢复、目前仍正常的站点
+        """
+        with self._lock:
+            return [site for site, alert in self._alerts.items()
+                    if alert.state == AlertState.OK and alert.recovered_at >= since]
+
+    def retain(self, keys: List[str]):
+        """
+        只保留仍在监控的站点、规则
+        """
+        with self._lock:
+            self._alerts = {key: alert for key, alert in self._alerts.items() if key in keys}
+
+    def dump(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {site: asdict(alert) for site, alert in self._alerts.items()}
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .history import Sample
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 拟合至少需要的采样数及时间跨度（天）
+MIN_SAMPLES = 3
+MIN_SPAN_DAYS = 1.0
+
+
+@dataclass(frozen=True)
+class Forecast:
+    """
+    站点分享率趋势预测
+    """
+    site: str
+    ratio: float
+    threshold: float
+    # 每天上传、下载增量（字节）
+    upload_rate: float
+    download_rate: float
+    # 预计多少天后低于阈值，不会低于时为 None
+    eta_days: Optional[float]
+
+
+def forecast(series: Dict[str, List[Sample]], thresholds: Dict[str, float]) -> List[Forecast]:
+    """
+    按最近的采样分别线性拟合各站点的上传量、下载量，推算分享率低于阈值的时间
+    分享率 (U0 + u·t) / (D0 + d·t) = 阈值 时 t = (阈值·D0 - U0) / (u - 阈值·d)
+    """
+    sites = [site for site, samples in series.items()
+             if site in thresholds and thresholds[site] > 0 and len(samples) >= MIN_SAMPLES
+             and (samples[-1].ts - samples[0].ts) / 86400 >= MIN_SPAN_DAYS]
+    if not sites:
+        return []
+    if np is not None:
+        slopes = _slopes_numpy([series[site] for site in sites])
+    else:
+        slopes = [_slopes_python(series[site]) for site in sites]
+    result = []
+    for site, (upload_rate, download_rate) in zip(sites, slopes):
+        last = series[site][-1]
+        threshold = thresholds[site]
+        upload, download = last.upload or 0, last.download or 0
+        ratio = upload / download if download else last.ratio
+        eta = None
+        denominator = upload_rate - threshold * download_rate
+        if ratio > threshold and denominator < 0:
+            eta = (threshold * download - upload) / denominator
+        result.append(Forecast(site=site, ratio=round(ratio, 3), threshold=threshold,
+                               upload_rate=upload_rate, download_rate=download_rate, eta_days=eta))
+    return result
+
+
+def _slopes_numpy(series: List[List[Sample]]) -> List[tuple]:
+    """
+    所有站点补齐为同样长度的矩阵，一次计算全部站点的最小二乘斜率
+    """
+    width = max(len(samples) for samples in series)
+    shape = (len(series), width)
+    t, u, d = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    mask = np.zeros(shape, dtype=bool)
+    for i, samples in enumerate(series):
+        n = len(samples)
+        base = samples[0].ts
+        t[i, :n] = [(s.ts - base) / 86400 for s in samples]
+        u[i, :n] = [s.upload or 0 for s in samples]
+        d[i, :n] = [s.download or 0 for s in samples]
+        mask[i, :n] = True
+    count = mask.sum(axis=1)
+    t_mean = (t * mask).sum(axis=1) / count
+    t_dev = np.where(mask, t - t_mean[:, None], 0.0)
+    t_var = (t_dev ** 2).sum(axis=1)
+    u_mean = (u * mask).sum(axis=1) / count
+    d_mean = (d * mask).sum(axis=1) / count
+    u_slope = (t_dev * np.where(mask, u - u_mean[:, None], 0.0)).sum(axis=1) / t_var
+    d_slope = (t_dev * np.where(mask, d - d_mean[:, None], 0.0)).sum(axis=1) / t_var
+    return list(zip(u_slope.tolist(), d_slope.tolist()))
+
+
+def _slopes_python(samples: List[Sample]) -> tuple:
+    """
+    未安装 numpy 时逐站点计算
+    """
+    base = samples[0].ts
+    t = [(s.ts - base) / 86400 for s in samples]
+    u = [s.upload or 0 for s in samples]
+    d = [s.download or 0 for s in samples]
+    n = len(samples)
+    t_mean, u_mean, d_mean = sum(t) / n, sum(u) / n, sum(d) / n
+    t_var = sum((x - t_mean) ** 2 for x in t)
+    u_slope = sum((x - t_mean) * (y - u_mean) for x, y in zip(t, u)) / t_var
+    d_slope = sum((x - t_mean) * (y - d_mean) for x, y in zip(t, d)) / t_var
+    return u_slope, d_slope
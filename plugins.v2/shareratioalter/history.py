@@ -0,0 +1,292 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 数据精度：原始、按小时、按天
+RAW, HOURLY, DAILY = 0, 1, 2
+_BUCKETS = {HOURLY: 3600, DAILY: 86400}
+# 采样字段，与 Sample 字段顺序一致
+_FIELDS = ("site", "ts", "ratio", "upload", "download", "seeding", "seeding_size", "bonus")
+_COLUMNS = ", ".join(_FIELDS)
+# 后续版本增加的字段及类型，旧数据库启动时补齐
+_EXTRA_COLUMNS = {"seeding": "INTEGER", "seeding_size": "INTEGER", "bonus": "REAL"}
+# 汇总中保留的每日分享率天数
+SPARK_DAYS = 30
+
+
+@dataclass(frozen=True)
+class Sample:
+    """
+    站点分享率采样
+    """
+    site: str
+    ts: int
+    ratio: float
+    upload: int
+    download: int
+    seeding: Optional[int] = None
+    seeding_size: Optional[int] = None
+    bonus: Optional[float] = None
+
+
+def _load_spark(text: str) -> List[Tuple[int, float]]:
+    """
+    解析汇总中的每日分享率，内容损坏时丢弃，写入新采样后重新累积
+    """
+    try:
+        return [(int(day), float(ratio)) for day, ratio in json.loads(text)]
+    except (TypeError, ValueError):
+        return []
+
+
+@dataclass(frozen=True)
+class SiteSummary:
+    """
+    站点汇总，写入采样时更新，供数据页直接读取
+    """
+    site: str
+    ts: int
+    ratio: float
+    upload: Optional[int]
+    download: Optional[int]
+    # 近 24 小时、7 天的上传、下载增量，缺少历史时为 None
+    upload_day: Optional[int]
+    download_day: Optional[int]
+    upload_week: Optional[int]
+    download_week: Optional[int]
+    # 预计多少天后低于阈值
+    eta_days: Optional[float]
+    # 每天最后一次的分享率 [(当天零点, 分享率)]
+    spark: List[Tuple[int, float]]
+
+
+class RatioHistory:
+    """
+    基于 SQLite 的站点分享率时间序列
+    每次检查追加一条原始采样，主键 (精度, 站点, 时间) 即索引；超过保留期的原始数据降采样为每小时一条，
+    小时数据再降采样为每天一条，每个时间段保留最后一条采样（上传、下载为累计值），天数据超过保留期后删除；
+    每个站点另有一行汇总，与采样在同一事务内增量更新，读取汇总不需要扫描历史
+    """
+
+    def __init__(self, path: Path, raw_days: int = 7, hourly_days: int = 90, daily_days: int = 730):
+        """
+        :param path: 数据库文件路径
+        :param raw_days: 原始数据保留天数
+        :param hourly_days: 小时数据保留天数
+        :param daily_days: 天数据保留天数
+        """
+        self._retention = {RAW: raw_days * 86400, HOURLY: hourly_days * 86400, DAILY: daily_days * 86400}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS samples (
+                level INTEGER NOT NULL,
+                site TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                ratio REAL NOT NULL,
+                upload INTEGER,
+                download INTEGER,
+                seeding INTEGER,
+                seeding_size INTEGER,
+                bonus REAL,
+                PRIMARY KEY (level, site, ts)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_samples_site_ts ON samples (site, ts);
+            CREATE TABLE IF NOT EXISTS summaries (
+                site TEXT PRIMARY KEY,
+                ts INTEGER NOT NULL,
+                ratio REAL NOT NULL,
+                upload INTEGER,
+                download INTEGER,
+                upload_day INTEGER,
+                download_day INTEGER,
+                upload_week INTEGER,
+                download_week INTEGER,
+                eta_days REAL,
+                spark TEXT NOT NULL
+            );
+        """)
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(samples)")}
+        for column, column_type in _EXTRA_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE samples ADD COLUMN {column} {column_type}")
+        self.__init_summaries()
+
+    def __init_summaries(self):
+        """
+        已有历史但还没有汇总时（升级后首次启动），按最近的历史生成一次每日分享率
+        """
+        if self._conn.execute("SELECT 1 FROM summaries LIMIT 1").fetchone():
+            return
+        since = int(time.time()) - SPARK_DAYS * 86400
+        rows = self._conn.execute("""
+            SELECT site, ts, ratio, MAX(ts) FROM samples WHERE ts >= ?
+            GROUP BY site, ts / 86400 ORDER BY site, ts
+        """, (since,)).fetchall()
+        sparks: Dict[str, List[Tuple[int, float]]] = {}
+        for site, ts, ratio, _ in rows:
+            sparks.setdefault(site, []).append((ts // 86400 * 86400, ratio))
+        if not sparks:
+            return
+        with self.__transaction():
+            for site, spark in sparks.items():
+                last = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM samples WHERE site = ? ORDER BY ts DESC LIMIT 1", (site,)).fetchone()
+                self.__upsert_summary(Sample(*last), spark[:-1], None)
+
+    @contextmanager
+    def __transaction(self, begin: str = "BEGIN"):
+        """
+        写入采样、汇总及降采样的事务，出错时回滚，避免一次写入失败后分享率历史无法再写入
+        """
+        self._conn.execute(begin)
+        try:
+            yield
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def append(self, samples: List[Tuple], ts: Optional[int] = None):
+        """
+        追加一次检查的全部站点采样并更新这些站点的汇总，一个事务内写入；汇总中的预测天数由 update_etas 更新
+        :param samples: (站点, 分享率, 上传量, 下载量, 做种数, 做种体积, 魔力值)，后三项可省略
+        """
+        if not samples:
+            return
+        ts = int(ts or time.time())
+        rows = [Sample(sample[0], ts, *(tuple(sample[1:]) + (None,) * len(_FIELDS))[:len(_FIELDS) - 2])
+                for sample in samples]
+        with self._lock:
+            with self.__transaction():
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO samples (level, {_COLUMNS}) VALUES (?, {', '.join('?' * len(_FIELDS))})",
+                    [(RAW, *(getattr(row, field) for field in _FIELDS)) for row in rows])
+                for row in rows:
+                    spark = self._conn.execute("SELECT spark FROM summaries WHERE site = ?", (row.site,)).fetchone()
+                    self.__upsert_summary(row, _load_spark(spark[0]) if spark else [])
+
+    def update_etas(self, sites: List[str], etas: Dict[str, float]):
+        """
+        更新站点汇总中预计多少天后低于阈值，不在 etas 中的站点清空
+        """
+        if not sites:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE summaries SET eta_days = ? WHERE site = ?",
+                                   [(etas.get(site), site) for site in sites])
+
+    def __upsert_summary(self, sample: Sample, spark: List[Tuple[int, float]]):
+        """
+        按新采样更新站点汇总：增量由索引取 24 小时、7 天前的一条采样计算，每日分享率替换当天或追加一天
+        """
+        deltas = []
+        for seconds in (86400, 7 * 86400):
+            base = self._conn.execute(
+                "SELECT upload, download FROM samples WHERE site = ? AND ts <= ? "
+                "ORDER BY ts DESC LIMIT 1", (sample.site, sample.ts - seconds)).fetchone()
+            for current, before in zip((sample.upload, sample.download), base or (None, None)):
+                deltas.append(current - before if current is not None and before is not None else None)
+        day = sample.ts // 86400 * 86400
+        if spark and spark[-1][0] == day:
+            spark = spark[:-1]
+        spark = (spark + [(day, sample.ratio)])[-SPARK_DAYS:]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (sample.site, sample.ts, sample.ratio, sample.upload, sample.download,
+             deltas[0], deltas[1], deltas[2], deltas[3], None, json.dumps(spark)))
+
+    def summaries(self) -> Dict[str, SiteSummary]:
+        """
+        全部站点的汇总，每个站点一行
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM summaries").fetchall()
+        return {row[0]: SiteSummary(*row[:-1], spark=_load_spark(row[-1])) for row in rows}
+
+    def latest(self, sites: Optional[List[str]] = None) -> Dict[str, Sample]:
+        """
+        每个站点最近一条采样
+        :param sites: 只查询这些站点，逐个按索引取最后一条；为 None 时查询全部站点
+        """
+        if sites is not None:
+            now = int(time.time())
+            samples = (self.sample_at(site, now) for site in sites)
+            return {sample.site: sample for sample in samples if sample}
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS}, MAX(ts) FROM samples GROUP BY site").fetchall()
+        return {row[0]: Sample(*row[:len(_FIELDS)]) for row in rows}
+
+    def history(self, site: str, since: int = 0, until: Optional[int] = None) -> List[Sample]:
+        """
+        站点在时间范围内的采样，按时间升序；各精度的数据时间段不重叠，直接合并
+        """
+        until = int(until or time.time())
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM samples WHERE site = ? AND ts BETWEEN ? AND ? "
+                "ORDER BY ts", (site, int(since), until)).fetchall()
+        return [Sample(*row) for row in rows]
+
+    def series_since(self, since: int, sites: Optional[List[str]] = None) -> Dict[str, List[Sample]]:
+        """
+        站点在某个时间之后的采样，一次查询按站点分组
+        :param sites: 只查询这些站点，为 None 时查询全部站点
+        """
+        sql = f"SELECT {_COLUMNS} FROM samples WHERE ts >= ?"
+        params: list = [int(since)]
+        if sites is not None:
+            if not sites:
+                return {}
+            sql += f" AND site IN ({','.join('?' * len(sites))})"
+            params += sites
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY site, ts", params).fetchall()
+        series: Dict[str, List[Sample]] = {}
+        for row in rows:
+            series.setdefault(row[0], []).append(Sample(*row))
+        return series
+
+    def sample_at(self, site: str, ts: int) -> Optional[Sample]:
+        """
+        站点在指定时间及之前的最后一条采样，用于计算一段时间内的变化量
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM samples WHERE site = ? AND ts <= ? "
+                "ORDER BY ts DESC LIMIT 1", (site, int(ts))).fetchone()
+        return Sample(*row) if row else None
+
+    def compact(self, now: Optional[int] = None):
+        """
+        降采样并删除过期数据，一个事务内完成
+        """
+        now = int(now or time.time())
+        with self._lock:
+            with self.__transaction():
+                for source, target in ((RAW, HOURLY), (HOURLY, DAILY)):
+                    cutoff = now - self._retention[source]
+                    bucket = _BUCKETS[target]
+                    # 每个时间段取最后一条采样，SQLite 中与 MAX() 同时查询的列取自最大值所在行
+                    values = ", ".join(_FIELDS[2:])
+                    self._conn.execute(f"""
+                        INSERT OR REPLACE INTO samples (level, {_COLUMNS})
+                        SELECT ?, site, ts / ? * ?, {values}
+                        FROM (SELECT {_COLUMNS}, MAX(ts)
+                              FROM samples WHERE level = ? AND ts < ?
+                              GROUP BY site, ts / ?)
+                    """, (target, bucket, bucket, source, cutoff, bucket))
+                    self._conn.execute("DELETE FROM samples WHERE level = ? AND ts < ?", (source, cutoff))
+                self._conn.execute("DELETE FROM samples WHERE level = ? AND ts < ?",
+                                   (DAILY, now - self._retention[DAILY]))
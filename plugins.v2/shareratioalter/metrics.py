@@ -0,0 +1,113 @@
+import operator
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.log import logger
+
+from .history import Sample
+
+# 快照中的指标
+METRICS = ("ratio", "upload", "download", "seeding", "seeding_size", "bonus")
+# 近 24 小时增量
+DAILY_METRICS = {f"{metric}_daily": metric for metric in ("upload", "download", "seeding_size", "bonus")}
+# 距上次上传增长的天数
+NO_UPLOAD_DAYS = "no_upload_days"
+
+_OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40, "P": 1 << 50}
+_RULE = re.compile(r"^(?P<site>[^:]+):\s*(?P<metric>\w+)\s*(?P<op><=|>=|<|>)\s*"
+                   r"(?P<value>[\d.]+)\s*(?P<unit>[KMGTP]?)B?$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class MetricRule:
+    """
+    指标规则，满足条件时告警
+    """
+    site: str
+    metric: str
+    op: str
+    value: float
+    text: str
+
+    def applies(self, site: str) -> bool:
+        return self.site == "*" or self.site == site
+
+
+def parse_rules(lines: List[str]) -> List[MetricRule]:
+    """
+    解析指标规则，每行一条，格式为 `站点:指标 比较符 数值`，站点为 * 时对所有监控的站点生效，
+    如 `*:bonus<10000`、`HDSky:upload_daily<10G`、`*:no_upload_days>=3`
+    """
+    rules = []
+    known = set(METRICS) | set(DAILY_METRICS) | {NO_UPLOAD_DAYS}
+    for line in lines or []:
+        line = line.strip()
+        if not line:
+            continue
+        matched = _RULE.match(line)
+        if not matched or matched.group("metric").lower() not in known:
+            logger.warning(f"指标规则 {line} 格式有误，已忽略")
+            continue
+        try:
+            value = float(matched.group("value")) * _UNITS[matched.group("unit").upper()]
+        except ValueError:
+            logger.warning(f"指标规则 {line} 数值有误，已忽略")
+            continue
+        rules.append(MetricRule(site=matched.group("site").strip(), metric=matched.group("metric").lower(),
+                                op=matched.group("op"), value=value, text=line))
+    return rules
+
+
+def history_days(rules: List[MetricRule]) -> float:
+    """
+    规则需要的历史天数
+    """
+    days = [rule.value + 1 for rule in rules if rule.metric == NO_UPLOAD_DAYS]
+    return max(days + [2.0]) if rules else 0
+
+
+def build_columns(snapshot: List[Dict], series: Dict[str, List[Sample]],
+                  now: int) -> Dict[str, List[Optional[float]]]:
+    """
+    一次遍历最新快照及历史采样，生成按列存放的指标，列中第 i 个值对应 snapshot 中第 i 个站点
+    """
+    columns: Dict[str, List[Optional[float]]] = {metric: [] for metric in ("site",) + METRICS}
+    for metric in DAILY_METRICS:
+        columns[metric] = []
+    columns[NO_UPLOAD_DAYS] = []
+    day_ago = now - 86400
+    for data in snapshot:
+        columns["site"].append(data["name"])
+        for metric in METRICS:
+            columns[metric].append(data.get(metric))
+        samples = series.get(data["name"], [])
+        # 24 小时前的最后一条采样
+        base = next((sample for sample in reversed(samples) if sample.ts <= day_ago), None)
+        for metric, source in DAILY_METRICS.items():
+            current, before = data.get(source), getattr(base, source, None) if base else None
+            columns[metric].append(current - before if current is not None and before is not None else None)
+        # 从最新往前找上传量与当前相同的最早采样，即最后一次增长之后的首次采样；历史范围内没有增长时取历史起点
+        upload = data.get("upload")
+        first_seen = now
+        for sample in reversed(samples):
+            if upload is None or sample.upload is None or sample.upload < upload:
+                break
+            first_seen = sample.ts
+        columns[NO_UPLOAD_DAYS].append((now - first_seen) / 86400 if upload is not None else None)
+    return columns
+
+
+def evaluate(rules: List[MetricRule], columns: Dict[str, List[Optional[float]]]) -> Dict[str, List[str]]:
+    """
+    逐条规则对整列比较，返回 站点 -> 触发的规则
+    """
+    breached: Dict[str, List[str]] = {}
+    sites = columns.get("site", [])
+    for rule in rules:
+        compare = _OPS[rule.op]
+        for site, value in zip(sites, columns[rule.metric]):
+            if value is not None and rule.applies(site) and compare(value, rule.value):
+                breached.setdefault(site, []).append(rule.text)
+    return breached